@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Streaming dose analytics over audit / batch output, in bounded memory.
+
+Per drug it keeps:
+  - a mergeable log-bucket quantile sketch of doses (~1% relative error)
+  - a HyperLogLog of distinct patients (records with a "patient" field)
+and across all drugs a count-min sketch of (drug, capped) and
+(drug, weight band) counts. Memory depends on the formulary size and the
+sketch parameters, never on how many records stream through, and the
+state of parallel shards merges into one report.
+
+Input records are JSON lines with at least "drug" and "dose"; "capped",
+"weight_kg" and "patient" are used when present (audit.py writes these).
+
+Usage:
+    python py/analytics.py build shard1.json /var/log/mydrugdose
+    python py/analytics.py build shard2.json other.jsonl
+    python py/analytics.py merge all.json shard1.json shard2.json
+    python py/analytics.py report all.json
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import audit
+import main_calc
+
+# weight band upper bounds in kg (last band is open-ended)
+WEIGHT_BANDS_KG = [1, 2, 3, 5, 10, 20, 40, 60]
+
+
+def weight_band(weight_kg: float) -> str:
+    lo = 0
+    for hi in WEIGHT_BANDS_KG:
+        if weight_kg < hi:
+            return f"{lo}-{hi} kg"
+        lo = hi
+    return f"{lo}+ kg"
+
+
+def _hash64(key: str, salt: bytes = b"") -> int:
+    return int.from_bytes(
+        hashlib.blake2b(key.encode("utf-8"), digest_size=8, salt=salt).digest(), "little")
+
+
+# ---------------------------------------------------------------------
+# SKETCHES
+# ---------------------------------------------------------------------
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch (DDSketch style) for positive values.
+
+    Values within a factor of gamma share a bucket, so any quantile comes
+    back within `rel_err` relative error. If more than max_buckets are in
+    use the lowest buckets are folded together (upper quantiles stay exact
+    to rel_err, which is what dose review cares about).
+    """
+
+    def __init__(self, rel_err: float = 0.01, max_buckets: int = 2048):
+        self.rel_err = rel_err
+        self.gamma = (1 + rel_err) / (1 - rel_err)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        if x <= 0:
+            self.zeros += 1
+            return
+        k = math.ceil(math.log(x) / self._log_gamma)
+        self.buckets[k] = self.buckets.get(k, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        keys = sorted(self.buckets)
+        extra = len(keys) - self.max_buckets
+        folded = sum(self.buckets.pop(k) for k in keys[:extra + 1])
+        self.buckets[keys[extra]] = self.buckets.get(keys[extra], 0) + folded
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.gamma != self.gamma:
+            raise ValueError("cannot merge quantile sketches with different rel_err")
+        for k, n in other.buckets.items():
+            self.buckets[k] = self.buckets.get(k, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        while len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if rank < seen:
+                return 2 * self.gamma ** k / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self) -> Dict:
+        return {"rel_err": self.rel_err, "max_buckets": self.max_buckets,
+                "zeros": self.zeros, "count": self.count,
+                "buckets": {str(k): n for k, n in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "QuantileSketch":
+        s = cls(d["rel_err"], d["max_buckets"])
+        s.zeros, s.count = d["zeros"], d["count"]
+        s.buckets = {int(k): n for k, n in d["buckets"].items()}
+        return s
+
+
+class CountMinSketch:
+    """Count-min sketch: approximate counts for an open-ended key space."""
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+
+    def _cells(self, key: str) -> Iterator[int]:
+        h = _hash64(key)
+        h1, h2 = h & 0xFFFFFFFF, h >> 32
+        for i in range(self.depth):
+            yield (h1 + i * h2) % self.width
+
+    def add(self, key: str, n: int = 1) -> None:
+        for row, c in zip(self.rows, self._cells(key)):
+            row[c] += n
+
+    def estimate(self, key: str) -> int:
+        return min(row[c] for row, c in zip(self.rows, self._cells(key)))
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("cannot merge count-min sketches of different shape")
+        for mine, theirs in zip(self.rows, other.rows):
+            for i, v in enumerate(theirs):
+                mine[i] += v
+
+    def to_dict(self) -> Dict:
+        return {"width": self.width, "depth": self.depth, "rows": self.rows}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "CountMinSketch":
+        s = cls(d["width"], d["depth"])
+        s.rows = d["rows"]
+        return s
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter (2**p registers, ~1.04/sqrt(2**p) error)."""
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, key: str) -> None:
+        h = _hash64(key, salt=b"hll")
+        idx = h & (self.m - 1)
+        rest = h >> self.p
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.p != self.p:
+            raise ValueError("cannot merge HyperLogLogs of different precision")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def estimate(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))  # small-range correction
+        return round(raw)
+
+    def to_dict(self) -> Dict:
+        return {"p": self.p, "registers": self.registers.hex()}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "HyperLogLog":
+        s = cls(d["p"])
+        s.registers = bytearray.fromhex(d["registers"])
+        return s
+
+
+# ---------------------------------------------------------------------
+# AGGREGATE
+# ---------------------------------------------------------------------
+
+
+class DoseAnalytics:
+    """All sketches for one shard (or a merge of shards)."""
+
+    def __init__(self):
+        self.records = 0
+        self.doses: Dict[str, QuantileSketch] = {}
+        self.patients: Dict[str, HyperLogLog] = {}
+        self.all_patients = HyperLogLog()
+        self.counts = CountMinSketch()
+
+    def add(self, rec: Dict) -> None:
+        drug = rec.get("drug")
+        dose = rec.get("dose")
+        if drug is None or dose is None:
+            return
+        self.records += 1
+        sketch = self.doses.get(drug)
+        if sketch is None:
+            sketch = self.doses[drug] = QuantileSketch()
+        sketch.add(float(dose))
+        self.counts.add(f"{drug}|capped={bool(rec.get('capped'))}")
+        if rec.get("weight_kg") is not None:
+            self.counts.add(f"{drug}|band={weight_band(float(rec['weight_kg']))}")
+        if rec.get("patient") is not None:
+            pid = str(rec["patient"])
+            self.all_patients.add(pid)
+            hll = self.patients.get(drug)
+            if hll is None:
+                hll = self.patients[drug] = HyperLogLog()
+            hll.add(pid)
+
+    def merge(self, other: "DoseAnalytics") -> None:
+        self.records += other.records
+        for drug, s in other.doses.items():
+            if drug in self.doses:
+                self.doses[drug].merge(s)
+            else:
+                self.doses[drug] = s
+        for drug, h in other.patients.items():
+            if drug in self.patients:
+                self.patients[drug].merge(h)
+            else:
+                self.patients[drug] = h
+        self.all_patients.merge(other.all_patients)
+        self.counts.merge(other.counts)
+
+    def to_dict(self) -> Dict:
+        return {
+            "records": self.records,
+            "doses": {k: v.to_dict() for k, v in self.doses.items()},
+            "patients": {k: v.to_dict() for k, v in self.patients.items()},
+            "all_patients": self.all_patients.to_dict(),
+            "counts": self.counts.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "DoseAnalytics":
+        a = cls()
+        a.records = d["records"]
+        a.doses = {k: QuantileSketch.from_dict(v) for k, v in d["doses"].items()}
+        a.patients = {k: HyperLogLog.from_dict(v) for k, v in d["patients"].items()}
+        a.all_patients = HyperLogLog.from_dict(d["all_patients"])
+        a.counts = CountMinSketch.from_dict(d["counts"])
+        return a
+
+    def report(self) -> List[str]:
+        fmt = main_calc.format_float
+        bands = [weight_band(lo) for lo in [0] + WEIGHT_BANDS_KG]
+        lines = [f"{self.records:,} doses, ~{self.all_patients.estimate():,} distinct patients", ""]
+        lines.append(f"{'Drug':40} {'n':>9} {'p50':>8} {'p90':>8} {'p99':>8} "
+                     f"{'capped':>8} {'patients':>9}")
+        lines.append("-" * 96)
+        for drug in sorted(self.doses):
+            s = self.doses[drug]
+            capped = self.counts.estimate(f"{drug}|capped=True")
+            pts = self.patients[drug].estimate() if drug in self.patients else 0
+            name = (drug[:37] + "...") if len(drug) > 40 else drug
+            lines.append(
+                f"{name:40} {s.count:9,} {fmt(s.quantile(0.5)):>8} {fmt(s.quantile(0.9)):>8} "
+                f"{fmt(s.quantile(0.99)):>8} {capped / s.count:8.1%} {pts:9,}"
+            )
+            hist = [(b, self.counts.estimate(f"{drug}|band={b}")) for b in bands]
+            hist = [f"{b}: {n:,}" for b, n in hist if n]
+            if hist:
+                lines.append(f"{'':40}   weight bands  " + ", ".join(hist))
+        return lines
+
+
+def read_records(paths: Iterable[str]) -> Iterator[Dict]:
+    """JSON lines from audit log directories, .jsonl files, or '-' for stdin."""
+    for path in paths:
+        if path == "-":
+            files = [None]
+        elif os.path.isdir(path):
+            files = audit.log_files(path)
+        else:
+            files = [path]
+        for f in files:
+            stream = sys.stdin if f is None else open(f, encoding="utf-8")
+            try:
+                for line in stream:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+            finally:
+                if f is not None:
+                    stream.close()
+
+
+# ---------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------
+
+
+def _load(path: str) -> DoseAnalytics:
+    with open(path, encoding="utf-8") as f:
+        return DoseAnalytics.from_dict(json.load(f))
+
+
+def _save(a: DoseAnalytics, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(a.to_dict(), f, separators=(",", ":"))
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Streaming dose analytics")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="stream records into a sketch file")
+    p_build.add_argument("output")
+    p_build.add_argument("inputs", nargs="+", help="audit dirs, .jsonl files, or '-'")
+    p_merge = sub.add_parser("merge", help="merge shard sketch files")
+    p_merge.add_argument("output")
+    p_merge.add_argument("shards", nargs="+")
+    p_report = sub.add_parser("report", help="print a report from a sketch file")
+    p_report.add_argument("state")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        a = DoseAnalytics()
+        for rec in read_records(args.inputs):
+            a.add(rec)
+        _save(a, args.output)
+        print(f"{a.records:,} records -> {args.output}")
+    elif args.cmd == "merge":
+        a = DoseAnalytics()
+        for shard in args.shards:
+            a.merge(_load(shard))
+        _save(a, args.output)
+        print(f"{len(args.shards)} shards, {a.records:,} records -> {args.output}")
+    else:
+        print("\n".join(_load(args.state).report()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
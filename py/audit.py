@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Append-only audit log of every dose the calculator produces.
+
+- AuditLog.record() only drops the record on an in-memory queue, so the
+  calculation never waits on the disk
+- A background writer thread batches records into compact JSONL, fsyncs
+  once per batch, and rotates the file when it passes max_bytes
+- If the queue is ever full the record is dropped, and the writer logs a
+  {"event": "dropped", "count": N} marker so the gap shows in the trail
+- `python py/audit.py scan DIR ...` filters millions of records quickly
+  (cheap substring pre-filter before any JSON parsing)
+
+Files in the log directory:
+    audit.jsonl                     current file
+    audit-YYYYmmdd-HHMMSS-NNN.jsonl rotated files
+
+Usage:
+    python py/audit.py scan /var/log/mydrugdose --drug epinephrine --capped
+    python py/audit.py scan /var/log/mydrugdose --since 2026-10-01 --count
+"""
+
+import argparse
+import glob
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+# Set this to a directory to have main_calc.py audit every calculation.
+AUDIT_DIR_ENV = "MYDRUGDOSE_AUDIT_DIR"
+
+CURRENT_NAME = "audit.jsonl"
+
+_STOP = object()
+
+
+class AuditLog:
+    """Non-blocking, batched, size-rotated JSONL audit writer."""
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024,
+                 batch_size: int = 4096, flush_interval_s: float = 0.5,
+                 queue_max: int = 100_000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.dropped = 0
+        self._dropped_logged = 0  # drops already written as a marker (writer thread)
+        self._drop_lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_max)
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, CURRENT_NAME)
+        self._file = open(self._path, "ab")
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, **fields) -> None:
+        """Queue one record. Never blocks; counts a drop if the queue is full."""
+        fields.setdefault("ts", time.time())
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Flush whatever is queued and stop the writer thread."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self.dropped:
+            print(f"[audit] {self.dropped} records dropped (queue full); "
+                  f"see \"dropped\" markers in {self._path}", file=sys.stderr)
+
+    # -----------------------------------------------------------------
+    # writer thread
+    # -----------------------------------------------------------------
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Dict] = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                self._write_drop_marker(batch)
+                if batch:
+                    self._write(batch)
+                continue
+            deadline = time.monotonic() + self.flush_interval_s
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            self._write_drop_marker(batch)
+            if batch:
+                self._write(batch)
+        self._file.close()
+
+    def _write_drop_marker(self, batch: List[Dict]) -> None:
+        """Append a marker for drops not yet logged."""
+        n = self.dropped - self._dropped_logged
+        if n > 0:
+            batch.append({"ts": time.time(), "event": "dropped", "count": n})
+            self._dropped_logged += n
+
+    def _write(self, batch: List[Dict]) -> None:
+        data = "".join(
+            json.dumps(r, separators=(",", ":"), ensure_ascii=False, default=str) + "\n"
+            for r in batch
+        ).encode("utf-8")
+        try:
+            if self._file.closed:  # an earlier rotation could not reopen it
+                self._file = open(self._path, "ab")
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except (OSError, ValueError) as e:
+            # never take the calculator down over the audit trail
+            print(f"[audit] write failed, {len(batch)} records lost: {e}", file=sys.stderr)
+            return
+        if self._file.tell() >= self.max_bytes:
+            try:
+                self._rotate()
+            except OSError as e:
+                print(f"[audit] rotation failed, still writing {self._path}: {e}", file=sys.stderr)
+
+    def _rotate(self) -> None:
+        self._file.close()
+        try:
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            n = 0
+            while True:
+                rotated = os.path.join(self.directory, f"audit-{stamp}-{n:03d}.jsonl")
+                if not os.path.exists(rotated):
+                    break
+                n += 1
+            os.replace(self._path, rotated)
+        finally:
+            # reopen even when the rename failed, so the writer keeps going
+            self._file = open(self._path, "ab")
+
+
+# ---------------------------------------------------------------------
+# READER
+# ---------------------------------------------------------------------
+
+
+def log_files(directory: str) -> List[str]:
+    """Rotated files oldest first, then the current file."""
+    files = sorted(glob.glob(os.path.join(directory, "audit-*.jsonl")))
+    current = os.path.join(directory, CURRENT_NAME)
+    if os.path.exists(current):
+        files.append(current)
+    return files
+
+
+def scan(directory: str, drug: Optional[str] = None, since: Optional[float] = None,
+         until: Optional[float] = None, capped_only: bool = False) -> Iterator[Dict]:
+    """Yield matching records from every log file, oldest first."""
+    needle = drug.lower().encode("utf-8") if drug else None
+    for path in log_files(directory):
+        with open(path, "rb") as f:
+            for line in f:
+                # cheap byte-level pre-filters before paying for json.loads
+                if needle is not None and needle not in line.lower():
+                    continue
+                if capped_only and b'"capped":true' not in line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn final line after a crash
+                if needle is not None and drug.lower() not in str(rec.get("drug", "")).lower():
+                    continue
+                ts = rec.get("ts", 0.0)
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts >= until:
+                    continue
+                yield rec
+
+
+def _parse_time(s: str) -> float:
+    return datetime.fromisoformat(s).timestamp()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Audit log reader")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_scan = sub.add_parser("scan", help="print (or count) matching records")
+    p_scan.add_argument("directory")
+    p_scan.add_argument("--drug", help="drug name substring (case-insensitive)")
+    p_scan.add_argument("--since", help="ISO date/time, inclusive")
+    p_scan.add_argument("--until", help="ISO date/time, exclusive")
+    p_scan.add_argument("--capped", action="store_true", help="only max-dose capped doses")
+    p_scan.add_argument("--count", action="store_true", help="print only the count")
+    args = parser.parse_args(argv)
+
+    records = scan(
+        args.directory, drug=args.drug,
+        since=_parse_time(args.since) if args.since else None,
+        until=_parse_time(args.until) if args.until else None,
+        capped_only=args.capped,
+    )
+    if args.count:
+        print(sum(1 for _ in records))
+        return 0
+    out = sys.stdout
+    for rec in records:
+        out.write(json.dumps(rec, separators=(",", ":"), ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
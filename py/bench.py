@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the dosing calculators.
+
+- Builds synthetic formularies (10 .. 100k entries) from the real DRUGS table
+- Times search_drugs, filter_by_population, calculate_dose, parse_infusion_unit,
+  the infusion-rate math and the dose_dump table render
+- Saves results as JSON and compares a run against a saved baseline
+
+Usage:
+    python py/bench.py run -o bench.json
+    python py/bench.py run --quick -o current.json
+    python py/bench.py compare bench.json current.json --threshold 0.25
+    python py/bench.py scrub 5000 3     # dose_scrub.py view over a synthetic table
+
+`compare` exits 1 if any benchmark got slower than the threshold allows.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+import dose_dump
+import main_calc
+import metrics
+
+DEFAULT_SIZES = [10, 100, 1_000, 10_000, 100_000]
+QUICK_SIZES = [10, 1_000]
+DEFAULT_SWEEPS = [100, 10_000]
+QUICK_SWEEPS = [100]
+
+# ---------------------------------------------------------------------
+# SYNTHETIC DATA
+# ---------------------------------------------------------------------
+
+
+def synthetic_formulary(n: int, seed: int = 0) -> List[Dict]:
+    """n entries cloned from the real tables with jittered doses and unique names."""
+    rng = random.Random(seed)
+    templates = dose_dump.DRUGS
+    out = []
+    for i in range(n):
+        d = dict(templates[i % len(templates)])
+        d["name"] = f"{d['name']} #{i}"
+        if d["dose_per_kg"] is not None:
+            d["dose_per_kg"] = round(d["dose_per_kg"] * rng.uniform(0.5, 1.5), 4)
+        out.append(d)
+    return out
+
+
+def weight_sweep(n: int, lo: float = 0.4, hi: float = 120.0) -> List[float]:
+    """n evenly spaced weights (kg) covering preemie to adult-sized patients."""
+    if n == 1:
+        return [lo]
+    step = (hi - lo) / (n - 1)
+    return [lo + i * step for i in range(n)]
+
+
+# ---------------------------------------------------------------------
+# TIMING
+# ---------------------------------------------------------------------
+
+
+def _time(fn: Callable[[], object], ops: int, repeat: int,
+          min_time: float = 0.02) -> Dict:
+    """
+    Best-of-`repeat` wall time for one call of fn, which performs `ops` ops.
+
+    Fast calls are looped (timeit-style autorange) until one sample takes
+    at least `min_time` seconds, so tiny benchmarks aren't timer noise.
+    """
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - t0 >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return {"seconds": best, "ops": ops, "per_op_us": best / ops * 1e6}
+
+
+def run_benchmarks(sizes: List[int], sweeps: List[int], repeat: int = 5) -> Dict[str, Dict]:
+    metrics.enable(False)
+    results: Dict[str, Dict] = {}
+
+    for n in sizes:
+        entries = synthetic_formulary(n)
+        snap = main_calc._build_snapshot(entries, version=0)
+        r = repeat if n < 100_000 else max(1, repeat // 2)
+
+        results[f"filter_by_population[n={n}]"] = _time(
+            lambda: main_calc.filter_by_population("n", snap), 1, r)
+        queries = ["epi", "d10", "saline", "zzz", ""]
+        results[f"search_drugs[n={n}]"] = _time(
+            lambda: [main_calc.search_drugs(q, "", snap) for q in queries],
+            len(queries), r)
+        results[f"render_table[n={n}]"] = _time(
+            lambda: dose_dump.render_table(entries, 12.5), n, r)
+
+    units = [d["dose_unit"] for d in dose_dump.DRUGS]
+    for w in sweeps:
+        weights = weight_sweep(w)
+        drugs = main_calc.DRUGS
+        results[f"calculate_dose[weights={w}]"] = _time(
+            lambda: [main_calc.calculate_dose(x, d) for x in weights for d in drugs],
+            w * len(drugs), repeat)
+        results[f"parse_infusion_unit[weights={w}]"] = _time(
+            lambda: [main_calc.parse_infusion_unit(u) for _ in weights for u in units],
+            w * len(units), repeat)
+        results[f"infusion_rate_ml_hr[weights={w}]"] = _time(
+            lambda: [main_calc.infusion_rate_ml_hr(0.1, 60.0, x, 4.0, 250.0)
+                     for x in weights],
+            w, repeat)
+
+    return results
+
+
+# ---------------------------------------------------------------------
+# COMPARE
+# ---------------------------------------------------------------------
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Return report lines; regressions are prefixed with 'REGRESSION'."""
+    lines = []
+    base = baseline["results"]
+    for name, cur in sorted(current["results"].items()):
+        if name not in base:
+            lines.append(f"new        {name:42} {cur['per_op_us']:10.3f} us/op")
+            continue
+        old_us = base[name]["per_op_us"]
+        new_us = cur["per_op_us"]
+        change = (new_us - old_us) / old_us if old_us else 0.0
+        tag = "REGRESSION" if change > threshold else "ok        "
+        lines.append(
+            f"{tag} {name:42} {old_us:10.3f} -> {new_us:10.3f} us/op ({change:+.1%})"
+        )
+    return lines
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_run = sub.add_parser("run", help="run the suite and save JSON")
+    p_run.add_argument("-o", "--output", default="bench.json")
+    p_run.add_argument("--quick", action="store_true", help="small sizes only")
+    p_run.add_argument("--sizes", type=int, nargs="+", help="formulary sizes")
+    p_run.add_argument("--sweeps", type=int, nargs="+", help="weight sweep sizes")
+    p_run.add_argument("--repeat", type=int, default=5)
+
+    p_cmp = sub.add_parser("compare", help="flag regressions against a baseline")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current")
+    p_cmp.add_argument("--threshold", type=float, default=0.25,
+                       help="allowed slowdown as a fraction (default 0.25)")
+
+    p_scrub = sub.add_parser("scrub", help="dose_scrub.py view over a synthetic formulary")
+    p_scrub.add_argument("entries", type=int)
+    p_scrub.add_argument("weight_kg", type=float)
+
+    args = parser.parse_args(argv)
+
+    if args.cmd == "scrub":
+        import dose_scrub
+        drugs = synthetic_formulary(args.entries)
+        dose_scrub.run(lambda: drugs, args.weight_kg)
+        return 0
+
+    if args.cmd == "run":
+        sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+        sweeps = args.sweeps or (QUICK_SWEEPS if args.quick else DEFAULT_SWEEPS)
+        results = run_benchmarks(sizes, sweeps, args.repeat)
+        out = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+            f.write("\n")
+        for name, r in results.items():
+            print(f"{name:42} {r['per_op_us']:10.3f} us/op")
+        print(f"\nSaved to {args.output}")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    lines = compare(baseline, current, args.threshold)
+    print("\n".join(lines))
+    return 1 if any(l.startswith("REGRESSION") for l in lines) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
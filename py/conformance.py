@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Cross-implementation conformance check: Python vs the HTML calculators.
+
+- Pulls the simple weight-based calc() entries out of html/pediatric.html,
+  html/neonatal.html and 2025/pediatric.html (per-kg dose, cap, decimals)
+- Pairs them with the matching Python formulary entry (see ALIASES)
+- Sweeps a dense weight grid (1M points by default) and counts where the
+  two disagree on the dose, on the max-dose cap, or on the displayed
+  (rounded) number
+
+Dose and cap disagreements are failures. Display-rounding differences
+(Python shows 3 significant figures, the pages use toFixed) are reported
+but only fail the run with --strict-rounding.
+
+Usage:
+    python py/conformance.py
+    python py/conformance.py --points 5000000 --verbose
+
+Uses numpy for the sweep when it is installed; otherwise falls back to a
+plain Python loop (use a smaller --points there).
+Exits 1 if any pair diverges.
+"""
+
+import argparse
+import math
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import main_calc
+
+try:
+    import numpy as np
+except ImportError:  # optional – pure Python fallback below
+    np = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# page -> population (drives the weight range swept)
+SOURCES: Dict[str, str] = {
+    "html/pediatric.html": "Pediatric",
+    "html/neonatal.html": "Neonatal",
+    "2025/pediatric.html": "Pediatric",
+}
+
+WEIGHT_RANGE_KG: Dict[str, Tuple[float, float]] = {
+    "Pediatric": (2.0, 120.0),
+    "Neonatal": (0.3, 6.0),
+}
+
+# "<page>:<calc id or 2025 label>" -> Python formulary name.
+# Only entries that are meant to be the same drug/indication are listed.
+ALIASES: Dict[str, str] = {
+    # html/pediatric.html
+    "html/pediatric.html:peds_ams_d10": "D10W bolus (peds)",
+    "html/pediatric.html:peds_hypo_d10": "D10W bolus (peds)",
+    "html/pediatric.html:peds_sz_d10": "D10W bolus (peds)",
+    "html/pediatric.html:peds_tox_d10": "D10W bolus (peds)",
+    "html/pediatric.html:peds_ams_hts_seizure": "Hypertonic Saline 3% (seizure, peds)",
+    "html/pediatric.html:peds_sz_hts": "Hypertonic Saline 3% (seizure, peds)",
+    "html/pediatric.html:peds_ams_hts_icp": "Hypertonic Saline 3% (ICP, peds)",
+    "html/pediatric.html:peds_nat_hts": "Hypertonic Saline 3% (ICP, peds)",
+    "html/pediatric.html:peds_ana_epi_im": "Epinephrine 1:1000 IM (anaphylaxis, peds)",
+    "html/pediatric.html:peds_asth_epi_im": "Epinephrine 1:1000 IM (anaphylaxis, peds)",
+    "html/pediatric.html:peds_ana_diphen": "Diphenhydramine (peds)",
+    "html/pediatric.html:peds_ana_dexa": "Dexamethasone (Decadron, peds)",
+    "html/pediatric.html:peds_asth_decadron": "Dexamethasone (Decadron, peds)",
+    "html/pediatric.html:peds_ua_dexa": "Dexamethasone (Decadron, peds)",
+    "html/pediatric.html:peds_asth_mag": "Magnesium sulfate (asthma, peds)",
+    "html/pediatric.html:peds_asth_terb": "Terbutaline bolus (peds)",
+    "html/pediatric.html:peds_bccb_glucagon_bolus": "Glucagon bolus (peds OD)",
+    "html/pediatric.html:peds_bccb_insulin_bolus": "Insulin regular bolus (peds OD)",
+    "html/pediatric.html:peds_bccb_caglu": "Calcium gluconate (peds OD)",
+    "html/pediatric.html:peds_bronch_ns_bolus": "Normal Saline bolus (peds)",
+    "html/pediatric.html:peds_clon_ns_bolus": "Normal Saline bolus (peds)",
+    "html/pediatric.html:peds_dka_ns_bolus": "Normal Saline bolus (peds)",
+    "html/pediatric.html:peds_shock_ns": "Normal Saline bolus (peds)",
+    "html/pediatric.html:peds_fever_ibuprofen": "Ibuprofen (peds)",
+    "html/pediatric.html:peds_fever_tyl": "Acetaminophen (peds)",
+    "html/pediatric.html:peds_pain_morphine": "Morphine (peds)",
+    "html/pediatric.html:peds_pain_fent": "Fentanyl bolus (peds)",
+    # html/neonatal.html
+    "html/neonatal.html:hypo_d10_bolus": "D10W bolus (neonatal)",
+    "html/neonatal.html:sz_d10_bolus": "D10W bolus (neonatal)",
+    "html/neonatal.html:brady_ns": "Normal Saline bolus (neonatal)",
+    "html/neonatal.html:hypotension_ns": "Normal Saline bolus (neonatal)",
+    # 2025/pediatric.html (keyed by the "• label:" text of the output line)
+    "2025/pediatric.html:Epinephrine 1 mg/mL (1:1000) IM": "Epinephrine 1:1000 IM (anaphylaxis, peds)",
+    "2025/pediatric.html:Epinephrine 1 mg/mL IM": "Epinephrine 1:1000 IM (anaphylaxis, peds)",
+    "2025/pediatric.html:Diphenhydramine IV/IM": "Diphenhydramine (peds)",
+    "2025/pediatric.html:Diphenhydramine IV/IM x1": "Diphenhydramine (peds)",
+    "2025/pediatric.html:Dexamethasone IV/PO": "Dexamethasone (Decadron, peds)",
+    "2025/pediatric.html:Magnesium sulfate IV": "Magnesium sulfate (asthma, peds)",
+    "2025/pediatric.html:Terbutaline SubQ": "Terbutaline bolus (peds)",
+    "2025/pediatric.html:Normal Saline bolus": "Normal Saline bolus (peds)",
+    "2025/pediatric.html:Regular insulin infusion": "Insulin infusion (DKA, peds)",
+    "2025/pediatric.html:D10W": "D10W bolus (peds)",
+    "2025/pediatric.html:3% hypertonic saline": "Hypertonic Saline 3% (seizure, peds)",
+}
+
+# mass units relative to mg; other units only convert to themselves
+MASS_MG = {"mcg": 0.001, "mg": 1.0, "g": 1000.0}
+
+UNIT_FROM_PREFIX = {"ml": "mL", "mg": "mg", "mcg": "mcg", "units": "unit",
+                    "unit": "unit", "meq": "mEq"}
+
+# ---------------------------------------------------------------------
+# EXTRACTION
+# ---------------------------------------------------------------------
+
+
+def _extract_html_entry(page: str, entry_id: str, name: str, body: str) -> Optional[Dict]:
+    consts = {m.group(1): float(m.group(2))
+              for m in re.finditer(r"const (\w+) = ([\d.]+);", body)}
+
+    # const vol = Math.min(weightKg * mlPerKg, max);  /  const mg = weightKg * mgPerKg;
+    m = re.search(
+        r"const (\w+) = (?:Math\.min\()?weightKg \* ((\w+?)PerKg)\b(?:, (\w+)\))?;", body)
+    if m:
+        dose_var, per_kg_var, prefix, cap_var = m.groups()
+        per_kg = consts.get(per_kg_var)
+        unit = UNIT_FROM_PREFIX.get(prefix.lower())
+    else:
+        # range form: const low = 0.05 * weightKg; ... lowAdj = Math.min(low, maxMg)
+        m = re.search(r"const low = ([\d.]+) \* weightKg;", body)
+        m_cap = re.search(r"const (\w+) = Math\.min\(low, (\w+)\);", body)
+        if not (m and m_cap):
+            return None
+        per_kg = float(m.group(1))
+        dose_var, cap_var = m_cap.groups()
+        unit = UNIT_FROM_PREFIX.get(cap_var[3:].lower())
+
+    m_dec = re.search(r"\$\{" + dose_var + r"\.toFixed\((\d)\)\}", body)
+    if per_kg is None or unit is None or not m_dec:
+        return None
+    return {
+        "key": f"{page}:{entry_id}",
+        "label": name,
+        "per_kg": per_kg,
+        "cap": consts.get(cap_var) if cap_var else None,
+        "unit": unit,
+        "decimals": int(m_dec.group(1)),
+    }
+
+
+def _extract_html(page: str, text: str) -> List[Dict]:
+    out = []
+    starts = [m.start() for m in re.finditer(r'\bid: "', text)] + [len(text)]
+    for a, b in zip(starts, starts[1:]):
+        block = text[a:b]
+        m_id = re.match(r'id: "([^"]+)"', block)
+        m_name = re.search(r'name: "([^"]+)"', block)
+        m_calc = re.search(r"calc\(weightKg\) \{(.*?)\n    \},", block, re.S)
+        if not (m_id and m_name and m_calc):
+            continue
+        entry = _extract_html_entry(page, m_id.group(1), m_name.group(1), m_calc.group(1))
+        if entry:
+            out.append(entry)
+    return out
+
+
+def _extract_2025(page: str, text: str) -> List[Dict]:
+    out = []
+    seen = set()
+    for m in re.finditer(
+            r"const (\w+) = (?:clampMax\(([\d.]+) \* w, ([\d.]+)\)|([\d.]+) \* w);", text):
+        var = m.group(1)
+        per_kg = float(m.group(2) or m.group(4))
+        cap = float(m.group(3)) if m.group(3) else None
+        m_fmt = re.search(
+            r"•\s*([^:`$\n]+?):\s*\$\{fmt\(" + var + r'\s*,\s*"\s*([^"]*)"\s*,\s*(\d+)\)',
+            text[m.end():])
+        if not m_fmt:
+            continue
+        label, unit_str, decimals = m_fmt.groups()
+        unit = unit_str.split("/")[0].strip()
+        unit = UNIT_FROM_PREFIX.get(unit.lower(), unit)
+        sig = (label, per_kg, cap)
+        if sig in seen:
+            continue
+        seen.add(sig)
+        out.append({
+            "key": f"{page}:{label}",
+            "label": label,
+            "per_kg": per_kg,
+            "cap": cap,
+            "unit": unit,
+            "decimals": int(decimals),
+        })
+    return out
+
+
+def extract_calcs(root: str = REPO_ROOT) -> List[Dict]:
+    """Return the simple per-kg calc() entries found in every HTML page."""
+    out = []
+    for page, population in SOURCES.items():
+        path = os.path.join(root, page)
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        entries = _extract_2025(page, text) if page.startswith("2025/") else _extract_html(page, text)
+        for e in entries:
+            e["population"] = population
+        out.extend(entries)
+    return out
+
+
+def _unit_factor(src: str, dst: str) -> Optional[float]:
+    if src == dst:
+        return 1.0
+    if src in MASS_MG and dst in MASS_MG:
+        return MASS_MG[src] / MASS_MG[dst]
+    return None
+
+
+# ---------------------------------------------------------------------
+# SWEEP
+# ---------------------------------------------------------------------
+
+
+def _py_display(x: float) -> float:
+    """Numeric value of main_calc.format_float(x) (integers as-is, else 3 sig figs)."""
+    return float(main_calc.format_float(x))
+
+
+def _py_display_array(py: "np.ndarray") -> "np.ndarray":
+    """
+    _py_display over an array.
+
+    Vectorized 3-significant-figure rounding, except that points where
+    float rounding could disagree with "%.3g" (near a half-way tie or a
+    power of ten) go through _py_display itself, so both sweeps share
+    one display model.
+    """
+    whole = py == np.floor(py)
+    lg = np.log10(np.where(py > 0, py, 1.0))
+    scale = 10.0 ** (2 - np.floor(lg))
+    scaled = py * scale
+    disp = np.where(whole, py, np.round(scaled) / scale)
+    unsure = ~whole & ((np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+                       | (np.abs(lg - np.round(lg)) < 1e-9))
+    for i in np.flatnonzero(unsure):
+        disp[i] = _py_display(float(py[i]))
+    return disp
+
+
+def _sweep_python(js: Dict, drug: Mapping, factor: float, weights: List[float]) -> Dict:
+    per_kg, cap = drug["dose_per_kg"], drug["max_dose"]
+    js_k, js_cap = js["per_kg"] * factor, (js["cap"] * factor if js["cap"] is not None else None)
+    tol = 0.5 * 10 ** -js["decimals"] * factor + 1e-12
+    counts = {"dose": 0, "cap": 0, "rounding": 0}
+    first: Dict[str, float] = {}
+    worst = 0.0
+    for w in weights:
+        py_raw = per_kg * w
+        py = min(py_raw, cap) if cap is not None else py_raw
+        js_raw = js_k * w
+        jsv = min(js_raw, js_cap) if js_cap is not None else js_raw
+        diff = abs(py - jsv)
+        if diff > 1e-9 * max(abs(py), 1.0):
+            capped = (cap is not None and py_raw > cap) or (js_cap is not None and js_raw > js_cap)
+            kind = "cap" if capped else "dose"
+        else:
+            js_disp = math.floor(jsv / factor * 10 ** js["decimals"] + 0.5) / 10 ** js["decimals"] * factor
+            if abs(_py_display(py) - js_disp) <= tol:
+                continue
+            kind = "rounding"
+        counts[kind] += 1
+        first.setdefault(kind, w)
+        worst = max(worst, diff)
+    return {"counts": counts, "first_weight": first, "max_abs_diff": worst}
+
+
+def _sweep_numpy(js: Dict, drug: Mapping, factor: float, lo: float, hi: float,
+                 points: int) -> Dict:
+    w = np.linspace(lo, hi, points)
+    per_kg, cap = drug["dose_per_kg"], drug["max_dose"]
+    py_raw = per_kg * w
+    py = np.minimum(py_raw, cap) if cap is not None else py_raw
+    js_raw = (js["per_kg"] * factor) * w
+    js_cap = js["cap"] * factor if js["cap"] is not None else None
+    jsv = np.minimum(js_raw, js_cap) if js_cap is not None else js_raw
+
+    diff = np.abs(py - jsv)
+    value_div = diff > 1e-9 * np.maximum(np.abs(py), 1.0)
+    capped = np.zeros(points, dtype=bool)
+    if cap is not None:
+        capped |= py_raw > cap
+    if js_cap is not None:
+        capped |= js_raw > js_cap
+
+    py_disp = _py_display_array(py)
+    p = 10.0 ** js["decimals"]
+    js_disp = np.floor(jsv / factor * p + 0.5) / p * factor
+    tol = 0.5 / p * factor + 1e-12
+    round_div = ~value_div & (np.abs(py_disp - js_disp) > tol)
+
+    masks = {
+        "dose": value_div & ~capped,
+        "cap": value_div & capped,
+        "rounding": round_div,
+    }
+    counts = {k: int(m.sum()) for k, m in masks.items()}
+    first = {k: float(w[np.argmax(m)]) for k, m in masks.items() if counts[k]}
+    worst = float(diff[value_div].max()) if value_div.any() else 0.0
+    return {"counts": counts, "first_weight": first, "max_abs_diff": worst}
+
+
+def check_pair(js: Dict, drug: Mapping, points: int) -> Dict:
+    """Sweep one HTML calc against its Python entry."""
+    result = {"key": js["key"], "python": drug["name"], "js": js, "problem": None}
+    py_unit = drug["dose_unit"].split("/")[0].strip()
+    factor = _unit_factor(js["unit"], py_unit)
+    if drug["dose_per_kg"] is None:
+        result["problem"] = "Python entry has no per-kg dose"
+        return result
+    if factor is None:
+        result["problem"] = f"unit mismatch: {js['unit']} vs {py_unit}"
+        return result
+
+    lo, hi = WEIGHT_RANGE_KG[js["population"]]
+    if np is not None:
+        result.update(_sweep_numpy(js, drug, factor, lo, hi, points))
+    else:
+        step = (hi - lo) / (points - 1)
+        result.update(_sweep_python(js, drug, factor, [lo + i * step for i in range(points)]))
+    return result
+
+
+def run(points: int, root: str = REPO_ROOT) -> Tuple[List[Dict], List[Dict]]:
+    """Return (pair results, HTML calcs with no Python counterpart)."""
+    formulary = main_calc.merged_formulary()
+    results, unmatched = [], []
+    for js in extract_calcs(root):
+        name = ALIASES.get(js["key"])
+        if name is None or name not in formulary:
+            unmatched.append(js)
+            continue
+        results.append(check_pair(js, formulary[name], points))
+    return results, unmatched
+
+
+# ---------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--points", type=int, default=1_000_000 if np is not None else 20_000,
+                        help="weights per pair in the sweep")
+    parser.add_argument("--root", default=REPO_ROOT, help="repository root")
+    parser.add_argument("--strict-rounding", action="store_true",
+                        help="treat display-rounding differences as failures")
+    parser.add_argument("--verbose", action="store_true",
+                        help="also list HTML calcs with no Python counterpart")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    results, unmatched = run(max(2, args.points), args.root)
+    elapsed = time.perf_counter() - t0
+
+    diverged = 0
+    for r in results:
+        js = r["js"]
+        src = (f"{js['per_kg']:g} {js['unit']}/kg"
+               + (f" max {js['cap']:g}" if js["cap"] is not None else "")
+               + f", {js['decimals']} dp")
+        if r["problem"]:
+            diverged += 1
+            print(f"DIVERGES  {r['key']}\n          -> {r['python']}: {r['problem']} [{src}]")
+            continue
+        c = r["counts"]
+        if not any(c.values()):
+            print(f"ok        {r['key']} -> {r['python']}")
+            continue
+        failing = c["dose"] or c["cap"] or (args.strict_rounding and c["rounding"])
+        diverged += bool(failing)
+        tag = "DIVERGES " if failing else "display  "
+        parts = [f"{k}={n:,} (from {r['first_weight'][k]:.3f} kg)" for k, n in c.items() if n]
+        print(f"{tag} {r['key']}\n          -> {r['python']}: "
+              f"{', '.join(parts)}; max diff {r['max_abs_diff']:.4g} [{src}]")
+
+    if args.verbose:
+        for js in unmatched:
+            print(f"unmapped  {js['key']} ({js['label']})")
+
+    print("-" * 72)
+    print(f"{len(results)} pairs x {args.points:,} weights in {elapsed:.2f}s "
+          f"({'numpy' if np is not None else 'pure Python'}); "
+          f"{diverged} diverge, {len(unmatched)} HTML calcs unmapped")
+    return 1 if diverged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
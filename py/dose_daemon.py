@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Resident, pre-warmed dose lookup daemon for py/dose_query.py.
+
+Imports main_calc once (formulary built, rules compiled) and answers
+one-line JSON requests on a Unix domain socket:
+
+    -> {"query": "epi", "weight_kg": 12, "population": "p", "factors": {}}
+    <- {"results": [...main_calc.lookup_doses()...], "version": 3, "served_by": "daemon"}
+
+Replies are cached per formulary version, so a hot reload (MYDRUGDOSE_FORMULARY)
+never serves stale doses. If MYDRUGDOSE_AUDIT_DIR is set every dose served is
+audited, cached or not.
+
+Usage:
+    python py/dose_daemon.py &
+    python py/dose_query.py epi 12
+"""
+
+import argparse
+import functools
+import json
+import math
+import os
+import signal
+import socketserver
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import audit
+import dose_query
+import main_calc
+import metrics
+
+_audit_log: Optional[audit.AuditLog] = None
+
+
+class _SnapshotKey:
+    """Formulary snapshot that hashes and compares by version only (cache key)."""
+
+    __slots__ = ("snap",)
+
+    def __init__(self, snap: Dict):
+        self.snap = snap
+
+    def __hash__(self) -> int:
+        return hash(self.snap["version"])
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, _SnapshotKey) and other.snap["version"] == self.snap["version"]
+
+
+@functools.lru_cache(maxsize=4096)
+def _lookup(key: _SnapshotKey, query: str, weight_kg: float, population: str,
+            factors: Tuple[Tuple[str, float], ...]) -> Tuple[tuple, bytes]:
+    snap = key.snap
+    results = main_calc.lookup_doses(query, weight_kg, population, dict(factors), snap)
+    reply = {"results": results, "version": snap["version"], "served_by": "daemon"}
+    return tuple(results), json.dumps(reply, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def handle_request(line: bytes) -> bytes:
+    try:
+        req = json.loads(line)
+        weight_kg = float(req["weight_kg"])
+        if not math.isfinite(weight_kg) or weight_kg <= 0:
+            raise ValueError("weight must be a finite number > 0")
+        raw_factors = req.get("factors") or {}
+        if not isinstance(raw_factors, dict):
+            raise ValueError("factors must be a JSON object")
+        factors = tuple(sorted((str(k), float(v)) for k, v in raw_factors.items()))
+        # one snapshot for the whole request: a reload mid-request can't mix versions
+        snap = main_calc.current_snapshot()
+        results, data = _lookup(_SnapshotKey(snap), str(req["query"]).lower().strip(),
+                                weight_kg, str(req.get("population", "")), factors)
+    except (ValueError, KeyError, TypeError) as e:
+        return json.dumps({"error": str(e) or type(e).__name__}).encode("utf-8") + b"\n"
+
+    metrics.inc("daemon_requests")
+    if _audit_log is not None:
+        for r in results:
+            if r["dose"] is not None:
+                _audit_log.record(drug=r["drug"], population=r["population"],
+                                  formulary_version=snap["version"], weight_kg=weight_kg,
+                                  raw=r["raw"], dose=r["dose"], capped=r["capped"],
+                                  unit=r["unit"], source="daemon")
+    return data
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        line = self.rfile.readline(65536)
+        if line:
+            self.wfile.write(handle_request(line))
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path: str) -> None:
+    global _audit_log
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700)  # private socket directory (see socket_path)
+    if os.path.exists(path) and not dose_query.owned_by_me(path):
+        raise SystemExit(f"{path} belongs to another user – refusing to use it")
+    if os.path.exists(path):
+        if dose_query.ask_daemon({"query": "", "weight_kg": 1}, path) is not None:
+            raise SystemExit(f"a daemon is already listening on {path}")
+        os.unlink(path)  # stale socket from a crashed daemon
+
+    formulary_path = os.environ.get(main_calc.FORMULARY_ENV)
+    if formulary_path:
+        main_calc.reload_formulary(formulary_path, force=True)
+        main_calc.start_formulary_watcher(formulary_path)
+    audit_dir = os.environ.get(audit.AUDIT_DIR_ENV)
+    _audit_log = audit.AuditLog(audit_dir) if audit_dir else None
+
+    old_umask = os.umask(0o077)  # socket usable by this user only
+    try:
+        server = _Server(path, _Handler)
+    finally:
+        os.umask(old_umask)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"dose daemon listening on {path} "
+          f"(formulary v{main_calc.current_snapshot()['version']})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+        if _audit_log is not None:
+            _audit_log.close()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-warmed dose lookup daemon")
+    parser.add_argument("--socket", default=None,
+                        help=f"socket path (default ${dose_query.SOCKET_ENV} or {dose_query.socket_path()})")
+    args = parser.parse_args(argv)
+    try:
+        serve(args.socket or dose_query.socket_path())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,6 +15,8 @@ Always verify against institutional protocols, MD, and pharmacy.
 
 from typing import List, Dict, Optional
 
+import metrics
+
 # ---------------------------------------------------------------------
 # DRUG TABLE
 #   This is the same structure as before; add/remove drugs as you like.
@@ -406,6 +408,61 @@ def filter_by_population(pop: str) -> List[Dict]:
     return [d for d in DRUGS if d["population"].lower() == target]
 
 
+def cap_state(lo: float, hi: float, max_dose: Optional[float]) -> str:
+    """
+    Where a raw dose range [lo, hi] sits against max_dose.
+
+    "none" (never over), "crosses" (goes over inside the range) or
+    "capped" (at or over max across the whole range). Shared with
+    main_calc.dose_interval so both report the same flag.
+    """
+    if max_dose is None or hi <= max_dose:
+        return "none"
+    return "capped" if lo >= max_dose else "crosses"
+
+
+@metrics.timed()
+def render_table(drugs: List[Dict], weight_kg: float,
+                 pct: Optional[float] = None) -> List[str]:
+    """
+    Format one RAW dose table row per drug.
+
+    With pct, each row also gets the raw range for weight ± pct % and a
+    cap_state() flag ("crosses" / "capped") where that range reaches the
+    drug's max dose.
+    """
+    lines = []
+    if pct is not None:
+        if not 0 <= pct < 100:
+            raise ValueError("pct must be >= 0 and < 100")
+        w_lo, w_hi = weight_kg * (1 - pct / 100.0), weight_kg * (1 + pct / 100.0)
+    for d in drugs:
+        per_kg = d.get("dose_per_kg", None)
+        if per_kg is None:
+            raw = None
+        else:
+            raw = per_kg * weight_kg
+
+        name = (d["name"][:37] + "...") if len(d["name"]) > 40 else d["name"]
+        line = (
+            f"{name:40} "
+            f"{d['population'][:8]:8} "
+            f"{d['route'][:10]:10} "
+            f"{format_float(per_kg):12} "
+            f"{d['dose_unit'][:14]:14} "
+            f"{(format_float(raw) + ' ' + (d['dose_unit'].replace('/kg', ''))) if raw is not None else 'N/A':15}"
+        )
+        if pct is not None and raw is not None:
+            lo, hi = per_kg * w_lo, per_kg * w_hi
+            max_dose = d.get("max_dose")
+            is_rate = "/kg/" in d["dose_unit"]  # infusion max is per kg, not comparable
+            state = "none" if is_rate else cap_state(lo, hi, max_dose)
+            flag = "" if state == "none" else state
+            line += f" {format_float(lo) + '–' + format_float(hi):17} {flag}"
+        lines.append(line)
+    return lines
+
+
 # ---------------------------------------------------------------------
 # MAIN
 # ---------------------------------------------------------------------
@@ -440,6 +497,18 @@ def main():
         "(e.g. 'p', 'n', or Enter for all): "
     ).strip()
 
+    # Optional weight uncertainty
+    pct = None
+    pct_str = input("Weight uncertainty ± % (Enter for none): ").strip()
+    if pct_str:
+        try:
+            pct = abs(float(pct_str.rstrip("%")))
+        except ValueError:
+            print("Couldn't parse that; no range shown.")
+        if pct is not None and not pct < 100:  # also catches nan
+            print("Range must be under 100 %; no range shown.")
+            pct = None
+
     drugs = filter_by_population(pop)
 
     print("\nRAW DOSE CALCULATIONS")
@@ -448,25 +517,12 @@ def main():
         f"{'Drug':40} {'Pop':8} {'Route':10} "
         f"{'Per kg':12} {'Unit':14} {'RAW dose':15}"
     )
+    if pct is not None:
+        header += f" {'±' + format_float(pct) + '% range':17} Cap"
     print(header)
     print("-" * 72)
 
-    for d in drugs:
-        per_kg = d.get("dose_per_kg", None)
-        if per_kg is None:
-            raw = None
-        else:
-            raw = per_kg * weight_kg
-
-        name = (d["name"][:37] + "...") if len(d["name"]) > 40 else d["name"]
-        line = (
-            f"{name:40} "
-            f"{d['population'][:8]:8} "
-            f"{d['route'][:10]:10} "
-            f"{format_float(per_kg):12} "
-            f"{d['dose_unit'][:14]:14} "
-            f"{(format_float(raw) + ' ' + (d['dose_unit'].replace('/kg', ''))) if raw is not None else 'N/A':15}"
-        )
+    for line in render_table(drugs, weight_kg, pct):
         print(line)
 
     print("-" * 72)
@@ -476,4 +532,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    metrics.run_cli(main)
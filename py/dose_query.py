@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+One-shot dose lookup: drug query + weight -> doses.
+
+Asks the resident daemon (py/dose_daemon.py) over a Unix domain socket,
+so the formulary is never rebuilt per call; if no daemon is listening it
+computes in-process instead. This module deliberately imports only the
+standard library at the top so the client stays cheap to start.
+
+Usage:
+    python py/dose_query.py epi 12
+    python py/dose_query.py gentamicin 1.2 -p n --pna-days 5
+    python py/dose_query.py ibuprofen 20 --json
+
+Exit status is 1 if nothing matched.
+"""
+
+import argparse
+import json
+import math
+import os
+import socket
+import sys
+from typing import Dict, List, Optional
+
+# Override the daemon socket location.
+SOCKET_ENV = "MYDRUGDOSE_SOCKET"
+
+
+def socket_path() -> str:
+    """
+    Daemon socket: $MYDRUGDOSE_SOCKET, else $XDG_RUNTIME_DIR/mydrugdose-UID.sock,
+    else a private (0700) mydrugdose-UID directory under $TMPDIR or /tmp, so
+    another local user cannot take the path first.
+    """
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, f"mydrugdose-{uid}.sock")
+    base = os.environ.get("TMPDIR") or "/tmp"
+    return os.path.join(base, f"mydrugdose-{uid}", "dose.sock")
+
+
+def owned_by_me(path: str) -> bool:
+    """True if path exists and belongs to this user (always True without uids)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return not hasattr(os, "getuid") or st.st_uid == os.getuid()
+
+
+def ask_daemon(request: Dict, path: Optional[str] = None,
+               timeout_s: float = 2.0) -> Optional[Dict]:
+    """Send one request; None if no daemon is listening."""
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    path = path or socket_path()
+    if not owned_by_me(path):
+        if os.path.exists(path):
+            print(f"warning: {path} belongs to another user – not using it", file=sys.stderr)
+        return None
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(timeout_s)
+    try:
+        s.connect(path)
+        s.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        chunks = []
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if chunk.endswith(b"\n"):
+                break
+    except OSError:
+        return None
+    finally:
+        s.close()
+    data = b"".join(chunks)
+    if not data.strip():  # closed without replying: treat as no daemon
+        return None
+    try:
+        return json.loads(data)
+    except ValueError:  # cut off mid-reply
+        return None
+
+
+def lookup(request: Dict) -> Dict:
+    """Daemon if available, otherwise the same computation in-process."""
+    reply = ask_daemon(request)
+    if reply is not None:
+        return reply
+    import main_calc  # slow path: pays the import and formulary build
+    return {"results": main_calc.lookup_doses(
+        request["query"], request["weight_kg"], request.get("population", ""),
+        request.get("factors")), "served_by": "in-process"}
+
+
+def _print_results(results: List[Dict], weight_kg: float) -> None:
+    for r in results:
+        if r["dose"] is None:
+            print(f"{r['drug']}: {r['note']}")
+            continue
+        dose = f"{r['dose']:.4g} {r['unit']}"
+        cap = " (max dose)" if r["capped"] else ""
+        note = f"  {r['note']}" if r["note"] else ""
+        print(f"{r['drug']}: {dose}{cap} for {weight_kg:g} kg{note}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="One-shot dose lookup")
+    parser.add_argument("query", help="drug name substring")
+    parser.add_argument("weight_kg", type=float)
+    parser.add_argument("-p", "--population", default="", help="'p', 'n' or all")
+    parser.add_argument("--pna-days", type=float)
+    parser.add_argument("--pma-weeks", type=float)
+    parser.add_argument("--age-years", type=float)
+    parser.add_argument("--json", action="store_true", help="print the raw JSON reply")
+    args = parser.parse_args(argv)
+    if not math.isfinite(args.weight_kg) or args.weight_kg <= 0:
+        parser.error("weight must be a finite number > 0")
+
+    factors = {k: v for k, v in (("pna_days", args.pna_days), ("pma_weeks", args.pma_weeks),
+                                 ("age_years", args.age_years)) if v is not None}
+    reply = lookup({"query": args.query, "weight_kg": args.weight_kg,
+                    "population": args.population, "factors": factors})
+    if "error" in reply:
+        print(f"error: {reply['error']}", file=sys.stderr)
+        return 2
+    if args.json:
+        print(json.dumps(reply))
+    else:
+        _print_results(reply["results"], args.weight_kg)
+    return 0 if reply["results"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Age / gestational-age / weight dependent dosing rules.
+
+A formulary entry may carry an "age_rules" list. Each rule bounds one or
+more patient factors with half-open [low, high) ranges (None = unbounded)
+and gives the dose and interval that apply there; the first matching rule
+wins, and a patient matching no rule gets None (not indicated):
+
+    "age_rules": [
+        {"weight_kg": [None, 1.0], "pna_days": [None, 14],
+         "dose_per_kg": 100.0, "interval_hr": 12.0},
+        ...
+    ]
+
+Factors:
+    weight_kg   current weight
+    pna_days    postnatal age in days
+    pma_weeks   postmenstrual age in weeks
+    age_years   age in years
+
+compile_rules() turns the list into a decision table over the rule
+breakpoints, so selecting a rule is one bisect per factor plus a table
+index, however many rules the drug has.
+"""
+
+import math
+from bisect import bisect_right
+from typing import Dict, List, Mapping, Optional, Sequence
+
+FACTORS = ("weight_kg", "pna_days", "pma_weeks", "age_years")
+
+RULE_KEYS = ("dose_per_kg", "interval_hr")
+
+
+def _in_range(x: float, bounds: Sequence[Optional[float]]) -> bool:
+    lo, hi = bounds
+    return (lo is None or x >= lo) and (hi is None or x < hi)
+
+
+def _is_number(x) -> bool:
+    return isinstance(x, (int, float)) and not isinstance(x, bool)
+
+
+def compile_rules(rules: List[Mapping]) -> Dict:
+    """Compile a drug's age_rules into a decision table."""
+    dims = [f for f in FACTORS if any(f in r for r in rules)]
+    for r in rules:
+        unknown = set(r) - set(FACTORS) - set(RULE_KEYS) - {"notes"}
+        if unknown:
+            raise ValueError(f"unknown age_rules keys: {', '.join(sorted(unknown))}")
+        for k in RULE_KEYS:
+            if k not in r:
+                raise ValueError(f"age_rules entry missing {k}")
+            if not _is_number(r[k]):
+                raise ValueError(f"age_rules {k} must be a number, got {r[k]!r}")
+        for f in dims:
+            if f in r and (len(r[f]) != 2
+                           or not all(b is None or _is_number(b) for b in r[f])):
+                raise ValueError(f"{f} must be a [low, high) pair")
+
+    breaks = []
+    for f in dims:
+        pts = sorted({b for r in rules if f in r for b in r[f] if b is not None})
+        breaks.append(pts)
+
+    # Cell i of a dimension covers [pts[i-1], pts[i]); cell 0 is (-inf, pts[0]).
+    def representative(pts: List[float], i: int) -> float:
+        if not pts:
+            return 0.0
+        return pts[0] - 1.0 if i == 0 else pts[i - 1]
+
+    sizes = [len(p) + 1 for p in breaks]
+    table: List[Optional[Mapping]] = []
+    total = 1
+    for s in sizes:
+        total *= s
+    for flat in range(total):
+        point = {}
+        rem = flat
+        for f, pts, s in zip(reversed(dims), reversed(breaks), reversed(sizes)):
+            rem, i = divmod(rem, s)
+            point[f] = representative(pts, i)
+        match = None
+        for r in rules:
+            if all(_in_range(point[f], r[f]) for f in dims if f in r):
+                match = r
+                break
+        table.append(match)
+
+    return {"dims": dims, "breaks": breaks, "sizes": sizes, "table": table}
+
+
+def select(compiled: Dict, factors: Mapping) -> Optional[Mapping]:
+    """
+    Return the rule for this patient, or None if no rule applies.
+
+    Raises ValueError if a needed factor is missing, or is not a finite
+    number >= 0.
+    """
+    flat = 0
+    for f, pts, s in zip(compiled["dims"], compiled["breaks"], compiled["sizes"]):
+        x = factors.get(f)
+        if x is None:
+            raise ValueError(f"{f} is needed to pick the dose for this drug")
+        if not _is_number(x) or not math.isfinite(x) or x < 0:
+            raise ValueError(f"{f} must be a finite number >= 0, got {x!r}")
+        flat = flat * s + bisect_right(pts, x)
+    return compiled["table"][flat]
+
+
+def select_batch(compiled_by_drug: Mapping[str, Dict], rows: List[Mapping]) -> List[Optional[Mapping]]:
+    """
+    Pick the rule for every census row ({"drug": name, <factors>...}).
+
+    compiled_by_drug is normally main_calc.current_snapshot()["rules"].
+
+    Rows for drugs without age rules (or missing a needed factor) get None.
+    """
+    out: List[Optional[Mapping]] = []
+    for row in rows:
+        compiled = compiled_by_drug.get(row["drug"])
+        if compiled is None:
+            out.append(None)
+            continue
+        try:
+            out.append(select(compiled, row))
+        except ValueError:
+            out.append(None)
+    return out
+
+
+def needed_factors(compiled: Dict) -> List[str]:
+    return list(compiled["dims"])
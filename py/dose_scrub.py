@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Live weight-scrubbing dose table (full-screen terminal).
+
+Move the weight in 0.1 kg (or 1 kg) steps and the table follows without
+reprinting everything:
+
+- A row is only recomputed when its dose can have changed: rows without a
+  per-kg dose never change, and a capped row stays put while the weight
+  stays past its cap breakpoint (max_dose / dose_per_kg)
+- Only cells whose formatted text differs from what is on screen are
+  redrawn; off-screen rows are not computed until scrolled into view
+- Rows come from the current formulary snapshot (plus dose_dump-only
+  entries) and the table is rebuilt when MYDRUGDOSE_FORMULARY reloads;
+  drugs with age_rules use --pna-days / --pma-weeks / --age-years and
+  read "age-dependent" without them
+
+Keys:
+    Left / Right     weight -/+ 0.1 kg        - / +   weight -/+ 1 kg
+    Up / Down        scroll                   PgUp / PgDn  scroll a page
+    q                quit
+
+Usage:
+    python py/dose_scrub.py 12.5 -p p
+    python py/dose_scrub.py 1.8 -p n --pna-days 10
+    python py/bench.py scrub 5000 3                # stress test, synthetic table
+
+*** EDUCATIONAL / REFERENCE ONLY ***
+"""
+
+import argparse
+import math
+import os
+import sys
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+import main_calc
+
+try:
+    import curses
+except ImportError:  # Windows without windows-curses
+    curses = None
+
+WEIGHT_MIN_KG = 0.1
+WEIGHT_MAX_KG = 150.0
+
+# (header, width)
+COLUMNS: List[Tuple[str, int]] = [("Drug", 44), ("Per kg", 18), ("Dose", 18), ("", 4)]
+
+
+class _Row:
+    __slots__ = ("drug", "ruled", "cap_dose", "cells", "weight_at")
+
+    def __init__(self, drug: Mapping, ruled: bool):
+        self.drug = drug
+        self.ruled = ruled  # dose comes from age_rules: recompute at every weight
+        # max_dose while this row is showing a capped dose, else None
+        self.cap_dose: Optional[float] = None
+        self.cells: Tuple[str, ...] = ()
+        self.weight_at: Optional[float] = None
+
+
+class ScrubTable:
+    """Dose rows for a weight, recomputed lazily and only when they can change."""
+
+    def __init__(self, drugs: List[Mapping], weight_kg: float,
+                 factors: Optional[Mapping] = None, snapshot: Optional[Dict] = None):
+        self.snapshot = snapshot or main_calc.current_snapshot()
+        self.factors = factors or {}
+        rules = self.snapshot["rules"]
+        self.rows = [_Row(d, d["name"] in rules) for d in drugs]
+        self.weight = weight_kg
+        self.recomputed = 0  # rows formatted since start (for the status line)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def set_weight(self, weight_kg: float) -> None:
+        self.weight = round(min(max(weight_kg, WEIGHT_MIN_KG), WEIGHT_MAX_KG), 1)
+
+    def cells(self, i: int) -> Tuple[str, ...]:
+        r = self.rows[i]
+        w = self.weight
+        if r.weight_at == w:
+            return r.cells
+        per_kg = r.drug["dose_per_kg"]
+        unchanged = r.weight_at is not None and not r.ruled and (
+            per_kg is None  # fixed dose: never depends on weight
+            or (r.cap_dose is not None and per_kg * w > r.cap_dose)  # still past the cap
+        )
+        if not unchanged:
+            r.cells, r.cap_dose = self._format(r.drug, w)
+            self.recomputed += 1
+        r.weight_at = w
+        return r.cells
+
+    def _format(self, d: Mapping, w: float) -> Tuple[Tuple[str, ...], Optional[float]]:
+        """(cells, max_dose if the dose is capped at this weight else None)."""
+        fmt = main_calc.format_float
+        name = (d["name"][:41] + "...") if len(d["name"]) > 44 else d["name"]
+        ruled, note = main_calc.age_rule_drug(d, w, self.factors, self.snapshot)
+        if ruled is None:
+            short = "age-dependent" if note.startswith("age-dependent") else "no age rule"
+            return (name, f"rule {d['dose_unit']}", short, ""), None
+        d = ruled
+        per_kg = f"{fmt(d['dose_per_kg'])} {d['dose_unit']}"
+        if d["dose_per_kg"] is None:
+            return (name, per_kg, "fixed – see notes", ""), None
+        inf = main_calc.parse_infusion_unit(d["dose_unit"])
+        if inf:
+            numerator, time_unit, _ = inf
+            return (name, per_kg, f"{fmt(d['dose_per_kg'] * w)} {numerator}/{time_unit}", ""), None
+        dose = main_calc.calculate_dose(w, d)
+        unit = d.get("max_unit") or d["dose_unit"].replace("/kg", "")
+        max_dose = d.get("max_dose")
+        if max_dose is not None and d["dose_per_kg"] * w > max_dose:
+            return (name, per_kg, f"{fmt(dose)} {unit}", "MAX"), max_dose
+        return (name, per_kg, f"{fmt(dose)} {unit}", ""), None
+
+
+# ---------------------------------------------------------------------
+# SCREEN
+# ---------------------------------------------------------------------
+
+
+class _Screen:
+    """Draws a ScrubTable, writing only the cells that changed on screen."""
+
+    HEADER_LINES = 3
+
+    def __init__(self, stdscr, table: ScrubTable):
+        self.scr = stdscr
+        self.table = table
+        self.top = 0
+        self.shown: Dict[Tuple[int, int], str] = {}
+        self.x = []
+        x = 0
+        for _, width in COLUMNS:
+            self.x.append(x)
+            x += width + 1
+
+    def _put(self, y: int, col: int, text: str, attr: int = 0) -> None:
+        if self.shown.get((y, col)) == text:
+            return
+        self.shown[(y, col)] = text
+        try:
+            self.scr.addstr(y, col, text, attr)
+        except curses.error:  # writing the bottom-right cell
+            pass
+
+    def page(self) -> int:
+        h, _ = self.scr.getmaxyx()
+        return max(1, h - self.HEADER_LINES - 1)
+
+    def scroll(self, delta: int) -> None:
+        self.top = max(0, min(self.top + delta, len(self.table) - self.page()))
+
+    def reset(self) -> None:
+        self.shown.clear()
+        self.scr.erase()
+
+    def draw(self) -> None:
+        h, w = self.scr.getmaxyx()
+        t = self.table
+        fmt = main_calc.format_float
+        width = max(10, w - 1)
+
+        self._put(0, 0, f" Weight {t.weight:6.1f} kg   ({len(t)} drugs)".ljust(width)[:width],
+                  curses.A_BOLD)
+        bar = max(1, width - 2)
+        filled = int(round(bar * (t.weight - WEIGHT_MIN_KG) / (WEIGHT_MAX_KG - WEIGHT_MIN_KG)))
+        self._put(1, 0, ("[" + "#" * filled + "-" * (bar - filled) + "]")[:width])
+        for c, (title, cw) in enumerate(COLUMNS):
+            if self.x[c] < width:
+                self._put(2, self.x[c], title.ljust(cw)[:width - self.x[c]], curses.A_UNDERLINE)
+
+        for y in range(self.HEADER_LINES, h - 1):
+            i = self.top + y - self.HEADER_LINES
+            cells = t.cells(i) if i < len(t) else ("",) * len(COLUMNS)
+            for c, (_, cw) in enumerate(COLUMNS):
+                if self.x[c] >= width:
+                    break
+                attr = curses.A_BOLD if c == 3 and cells[c] else 0
+                self._put(y, self.x[c], cells[c][:cw].ljust(cw)[:width - self.x[c]], attr)
+
+        status = (f" Left/Right 0.1 kg  -/+ 1 kg  Up/Down PgUp/PgDn scroll  q quit"
+                  f"   rows {self.top + 1}-{min(len(t), self.top + self.page())}"
+                  f"  recomputed {t.recomputed}  [{fmt(t.weight)} kg]")
+        self._put(h - 1, 0, status.ljust(width)[:width], curses.A_REVERSE)
+        self.scr.noutrefresh()
+        curses.doupdate()
+
+
+def run(drugs_fn: Callable[[], List[Mapping]], weight_kg: float,
+        factors: Optional[Mapping] = None) -> None:
+    """
+    Show the scrubbing view until q. drugs_fn() gives the rows for the
+    current formulary snapshot; the table is rebuilt when the version changes.
+    """
+    if curses is None:
+        raise SystemExit("the curses module is not available on this platform")
+    curses.wrapper(_run, drugs_fn, weight_kg, factors)
+
+
+def _run(stdscr, drugs_fn: Callable[[], List[Mapping]], weight_kg: float,
+         factors: Optional[Mapping]) -> None:
+    curses.curs_set(0)
+    stdscr.keypad(True)
+    stdscr.timeout(500)  # wake up to notice formulary reloads
+
+    def build(weight: float) -> ScrubTable:
+        t = ScrubTable(drugs_fn(), 0.0, factors)
+        t.set_weight(weight)
+        return t
+
+    table = build(weight_kg)
+    screen = _Screen(stdscr, table)
+    screen.reset()
+    steps = {curses.KEY_LEFT: -0.1, curses.KEY_RIGHT: 0.1,
+             ord("-"): -1.0, ord("+"): 1.0, ord("="): 1.0}
+    while True:
+        screen.draw()
+        key = stdscr.getch()
+        if key in (ord("q"), ord("Q")):
+            return
+        if main_calc.current_snapshot() is not table.snapshot:
+            table = screen.table = build(table.weight)
+            screen.scroll(0)
+            screen.reset()
+        if key in steps:
+            table.set_weight(table.weight + steps[key])
+        elif key == curses.KEY_DOWN:
+            screen.scroll(1)
+        elif key == curses.KEY_UP:
+            screen.scroll(-1)
+        elif key == curses.KEY_NPAGE:
+            screen.scroll(screen.page())
+        elif key == curses.KEY_PPAGE:
+            screen.scroll(-screen.page())
+        elif key == curses.KEY_RESIZE:
+            screen.scroll(0)
+            screen.reset()
+
+
+def formulary_rows(population: str) -> List[Mapping]:
+    """Current snapshot plus dose_dump-only entries, filtered by population."""
+    pop = population.strip().lower()
+    target = ("pediatric" if pop.startswith("p") else
+              "neonatal" if pop.startswith("n") else None)
+    return [d for d in main_calc.merged_formulary().values()
+            if target is None or d["population"].lower() == target]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Live weight-scrubbing dose table")
+    parser.add_argument("weight_kg", type=float, help="starting weight in kg")
+    parser.add_argument("-p", "--population", default="", help="'p', 'n' or all")
+    parser.add_argument("--pna-days", type=float)
+    parser.add_argument("--pma-weeks", type=float)
+    parser.add_argument("--age-years", type=float)
+    args = parser.parse_args(argv)
+    if not math.isfinite(args.weight_kg) or args.weight_kg <= 0:
+        parser.error("weight must be a finite number > 0")
+    factors = {k: v for k, v in (("pna_days", args.pna_days), ("pma_weeks", args.pma_weeks),
+                                 ("age_years", args.age_years)) if v is not None}
+    if curses is None:
+        parser.error("the curses module is not available on this platform")
+
+    formulary_path = os.environ.get(main_calc.FORMULARY_ENV)
+    if formulary_path:
+        main_calc.reload_formulary(formulary_path, force=True)
+        main_calc.start_formulary_watcher(formulary_path)
+    run(lambda: formulary_rows(args.population), args.weight_kg, factors)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Dose-to-volume draw-up cards.
+
+- Converts each calculated dose into mL using a catalog of stock
+  concentrations (STOCKS), then picks the smallest syringe that holds it
+  (SYRINGES) and rounds to that syringe's graduation
+- All the volume math is exact integer arithmetic in micro-units
+  (1e-6 mg, 1e-6 unit, microlitres), so 0.1 + 0.2 style float error never
+  reaches the card; a dose already at its max is rounded down, not up
+- Prints a whole card (every drug x every weight band) in one batch
+- Each line shows the amount actually drawn up; a line whose rounding
+  moves it more than ROUNDING_FLAG_PCT from the calculated dose is flagged
+- Drugs with age_rules take their per-kg dose from the rule for the
+  given ages; without them the line says "age-dependent" and why
+
+Usage:
+    python py/drawup.py 3.5 12 25
+    python py/drawup.py --bands 2 40 2 -p p
+    python py/drawup.py 1.5 2.5 -p n --pna-days 10
+
+*** EDUCATIONAL / REFERENCE ONLY ***
+Always verify concentrations against what is actually stocked.
+"""
+
+import argparse
+import math
+import sys
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import main_calc
+
+MICRO = 1_000_000  # micro-units per unit (mg, unit, mL)
+
+# drug name -> stock concentrations (amount per mL, unit, label), most dilute first.
+# The most dilute stock whose volume fits the largest syringe is used.
+# Volume-dosed fluids (mL/kg) need no entry.
+STOCKS: Dict[str, List[Tuple[float, str, str]]] = {
+    "Epinephrine 1:1000 IM (anaphylaxis, peds)": [(1.0, "mg", "1 mg/mL (1:1000)")],
+    "Diphenhydramine (peds)": [(50.0, "mg", "50 mg/mL")],
+    "Dexamethasone (Decadron, peds)": [(4.0, "mg", "4 mg/mL"), (10.0, "mg", "10 mg/mL")],
+    "Magnesium sulfate (asthma, peds)": [(500.0, "mg", "500 mg/mL (50%) dilute IV")],
+    "Ibuprofen (peds)": [(20.0, "mg", "100 mg/5 mL susp")],
+    "Acetaminophen (peds)": [(32.0, "mg", "160 mg/5 mL susp")],
+    "Morphine (peds)": [(1.0, "mg", "1 mg/mL"), (2.0, "mg", "2 mg/mL"), (4.0, "mg", "4 mg/mL")],
+    "Ampicillin (neonatal)": [(100.0, "mg", "100 mg/mL reconstituted")],
+    "Gentamicin (neonatal)": [(10.0, "mg", "10 mg/mL (pediatric)"), (40.0, "mg", "40 mg/mL")],
+}
+
+# (capacity mL, graduation mL), smallest first
+SYRINGES: List[Tuple[float, float]] = [
+    (1.0, 0.01), (3.0, 0.1), (5.0, 0.2), (10.0, 0.2), (20.0, 1.0), (60.0, 1.0),
+]
+
+
+def _micro(x: float) -> int:
+    """Float (as printed in the formulary) to integer micro-units."""
+    return int(round(x * MICRO))
+
+
+# flag a line when syringe rounding moves the dose by more than this
+ROUNDING_FLAG_PCT = 5.0
+
+_SYRINGES_UL = [(_micro(cap), _micro(grad), cap) for cap, grad in SYRINGES]
+
+
+def _dose_unit(drug: Mapping) -> str:
+    return (drug["max_unit"] or drug["dose_unit"].split("/")[0]).strip()
+
+
+def _stock_for(drug: Mapping, dose_u: int) -> Optional[Tuple[int, str, str]]:
+    """Pick a stock: (micro-units per mL, unit, label), or None if not stocked."""
+    unit = _dose_unit(drug)
+    if unit == "mL":
+        return MICRO, "mL", "as supplied"
+    stocks = STOCKS.get(drug["name"])
+    if not stocks:
+        return None
+    largest = _SYRINGES_UL[-1][0]
+    chosen = None
+    for amount, s_unit, label in stocks:
+        if s_unit != unit:
+            continue
+        conc_u = _micro(amount)
+        chosen = (conc_u, s_unit, label)
+        if dose_u * MICRO // conc_u <= largest:
+            break
+    return chosen
+
+
+def draw_up(weight_kg: float, drug: Mapping, factors: Optional[Mapping] = None,
+            snapshot: Optional[Dict] = None) -> Dict:
+    """
+    Draw-up line for one drug at one weight.
+
+    Keys: dose, unit, stock, volume_ml, syringe_ml, syringes, given,
+    rounding_pct (given vs dose, signed), note.
+    `factors` (pna_days, pma_weeks, age_years) pick the age rule for drugs
+    that have one.
+    """
+    card = {"drug": drug["name"], "dose": None, "unit": _dose_unit(drug), "stock": None,
+            "volume_ml": None, "syringe_ml": None, "syringes": 0, "given": None, "rounding_pct": None, "note": ""}
+    if main_calc.parse_infusion_unit(drug["dose_unit"]):
+        card["note"] = "infusion – use pump rate calc"
+        return card
+    snap = snapshot or main_calc.current_snapshot()
+    drug, note = main_calc.age_rule_drug(drug, weight_kg, factors, snap)
+    if drug is None:
+        card["note"] = note
+        return card
+    dose = main_calc.calculate_dose(weight_kg, drug)
+    if dose is None:
+        card["note"] = "fixed dose – see protocol"
+        return card
+    card["dose"] = dose
+
+    dose_u = _micro(dose)
+    stock = _stock_for(drug, dose_u)
+    if stock is None:
+        card["note"] = "no stock concentration in catalog"
+        return card
+    conc_u, _, label = stock
+    card["stock"] = label
+
+    # exact volume in microlitres, then the smallest syringe that holds it
+    vol_ul_num = dose_u * MICRO  # / conc_u
+    cap_ul, grad_ul, cap_ml = _SYRINGES_UL[-1]
+    count = 1
+    for c_ul, g_ul, c_ml in _SYRINGES_UL:
+        if vol_ul_num <= c_ul * conc_u:
+            cap_ul, grad_ul, cap_ml = c_ul, g_ul, c_ml
+            break
+    else:
+        count = -(-vol_ul_num // (cap_ul * conc_u))  # ceil: several largest syringes
+
+    # round to the nearest graduation (half up); a capped dose rounds down
+    steps = (2 * vol_ul_num + grad_ul * conc_u) // (2 * grad_ul * conc_u)
+    capped = drug["max_dose"] is not None and dose < drug["dose_per_kg"] * weight_kg
+    if capped and steps * grad_ul * conc_u > vol_ul_num:
+        steps = vol_ul_num // (grad_ul * conc_u)  # already at max: round down
+    vol_ul = steps * grad_ul
+    if vol_ul == 0:
+        card["note"] = "below syringe graduation – dilute"
+        return card
+
+    card["volume_ml"] = vol_ul / MICRO
+    card["syringe_ml"] = cap_ml
+    card["syringes"] = count
+    card["given"] = (vol_ul * conc_u // MICRO) / MICRO
+    card["rounding_pct"] = (card["given"] - dose) / dose * 100.0
+    return card
+
+
+def draw_up_batch(weights: List[float], drugs: List[Mapping],
+                  factors: Optional[Mapping] = None) -> List[List[Dict]]:
+    """One list of draw-up lines per weight band."""
+    snap = main_calc.current_snapshot()
+    return [[draw_up(w, d, factors, snap) for d in drugs] for w in weights]
+
+
+# ---------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------
+
+
+def _print_card(weight_kg: float, lines: List[Dict]) -> None:
+    fmt = main_calc.format_float
+    print("=" * 96)
+    print(f" DRAW-UP CARD  –  {fmt(weight_kg)} kg")
+    print("=" * 96)
+    print(f"{'Drug':32} {'Dose':10} {'Stock':24} {'Draw up':18} {'Gives':10}")
+    print("-" * 96)
+    for c in lines:
+        name = (c["drug"][:29] + "...") if len(c["drug"]) > 32 else c["drug"]
+        dose = f"{fmt(c['dose'])} {c['unit']}" if c["dose"] is not None else "-"
+        if c["volume_ml"] is None:
+            print(f"{name:32} {dose:10} {c['note']}")
+            continue
+        syr = (f"{c['syringes']} x {fmt(c['syringe_ml'])} mL" if c["syringes"] > 1
+               else f"{fmt(c['syringe_ml'])} mL syr")
+        draw = f"{c['volume_ml']:g} mL ({syr})"
+        given = f"{fmt(c['given'])} {c['unit']}"
+        flag = (f"  ROUNDED {c['rounding_pct']:+.0f}%"
+                if abs(c["rounding_pct"]) > ROUNDING_FLAG_PCT else "")
+        print(f"{name:32} {dose:10} {(c['stock'] or '')[:24]:24} {draw:18} {given:10}{flag}".rstrip())
+    print()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Print draw-up cards")
+    parser.add_argument("weights", type=float, nargs="*", help="weights in kg")
+    parser.add_argument("--bands", type=float, nargs=3, metavar=("START", "STOP", "STEP"),
+                        help="weight bands, e.g. 2 40 2")
+    parser.add_argument("-p", "--population", default="", help="'p', 'n' or all")
+    parser.add_argument("--pna-days", type=float)
+    parser.add_argument("--pma-weeks", type=float)
+    parser.add_argument("--age-years", type=float)
+    args = parser.parse_args(argv)
+
+    for w in args.weights:
+        if not math.isfinite(w) or w <= 0:
+            parser.error(f"weight must be a finite number > 0, got {w:g}")
+    weights = list(args.weights)
+    if args.bands:
+        start, stop, step = args.bands
+        if not all(math.isfinite(x) for x in args.bands):
+            parser.error("--bands values must be finite numbers")
+        if start <= 0:
+            parser.error("--bands START must be greater than 0")
+        if stop < start:
+            parser.error("--bands STOP must not be below START")
+        if step <= 0:
+            parser.error("--bands STEP must be greater than 0")
+        n = int(round((stop - start) / step)) + 1
+        weights += [round(start + i * step, 6) for i in range(n)]
+    if not weights:
+        parser.error("give at least one weight or --bands")
+
+    factors = {k: v for k, v in (("pna_days", args.pna_days), ("pma_weeks", args.pma_weeks),
+                                 ("age_years", args.age_years)) if v is not None}
+    for k, v in factors.items():
+        if not math.isfinite(v) or v < 0:
+            parser.error(f"{k} must be a finite number >= 0")
+    drugs = main_calc.filter_by_population(args.population)
+    for w, lines in zip(weights, draw_up_batch(weights, drugs, factors)):
+        _print_card(w, lines)
+    print("Verify every concentration against stock on hand and your protocol.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Search-as-you-type drug lookup for the interactive CLI.
+
+IncrementalSearch keeps the match list for every prefix of the current
+query, so each keystroke only filters the previous (already narrowed)
+list, and backspace just pops back to it. Matches are ranked:
+
+    1. name starts with the query
+    2. a word in the name starts with the query
+    3. query appears anywhere in the name
+    ... then by how often the drug was picked this session, then by name.
+
+read_query() shows the ranked list live under the prompt on a terminal
+(Tab completes the top match); without a terminal it falls back to
+input(), with readline Tab completion when readline is available.
+"""
+
+import codecs
+import heapq
+import os
+import select
+import sys
+from typing import List, Mapping, Optional, Sequence
+
+import metrics
+
+try:
+    import readline
+except ImportError:  # Windows
+    readline = None
+
+try:
+    import termios
+    import tty
+except ImportError:  # Windows
+    termios = None
+
+LIVE_ROWS = 8
+
+# how long to wait for the rest of an escape sequence after Esc
+ESC_TIMEOUT_S = 0.05
+
+
+class IncrementalSearch:
+    """Ranked substring search that narrows on each keystroke."""
+
+    def __init__(self, candidates: Sequence[Mapping], usage: Optional[Mapping[str, int]] = None):
+        self._usage = usage if usage is not None else {}
+        # (lowercased name, drug) for every candidate; the stack holds the
+        # matches for each prefix of the query typed so far.
+        self._stack = [("", [(d["name"].lower(), d) for d in candidates])]
+
+    @metrics.timed("search_drugs")  # same histogram as main_calc.search_drugs
+    def update(self, query: str, limit: Optional[int] = None) -> List[Mapping]:
+        """Ranked matches for `query` (top `limit` only, if given)."""
+        q = query.lower().strip()
+        stack = self._stack
+        while len(stack) > 1 and not q.startswith(stack[-1][0]):
+            stack.pop()
+        base_q, matches = stack[-1]
+        if q != base_q:
+            # every match for q also matched its prefix base_q
+            matches = [m for m in matches if q in m[0]]
+            stack.append((q, matches))
+
+        usage = self._usage
+        word_q = " " + q
+        paren_q = "(" + q
+
+        def rank(m):
+            name = m[0]
+            if name.startswith(q):
+                tier = 0
+            elif word_q in name or paren_q in name:
+                tier = 1
+            else:
+                tier = 2
+            return (tier, -usage.get(m[1]["name"], 0), name)
+
+        if limit is not None and limit < len(matches):
+            ranked = heapq.nsmallest(limit, matches, key=rank)
+        else:
+            ranked = sorted(matches, key=rank)
+        return [d for _, d in ranked]
+
+
+# ---------------------------------------------------------------------
+# PROMPTS
+# ---------------------------------------------------------------------
+
+
+def read_query(prompt: str, search: IncrementalSearch) -> str:
+    """Read a drug query, live-narrowing on a terminal."""
+    if termios is not None and sys.stdin.isatty() and sys.stdout.isatty():
+        return _live_query(prompt, search)
+    if readline is None:
+        return input(prompt).strip()
+
+    def complete(text: str, state: int) -> Optional[str]:
+        names = [d["name"] for d in search.update(text)]
+        return names[state] if state < len(names) else None
+
+    old_completer, old_delims = readline.get_completer(), readline.get_completer_delims()
+    readline.set_completer(complete)
+    readline.set_completer_delims("")  # complete on the whole line, spaces included
+    readline.parse_and_bind("tab: complete")
+    try:
+        return input(prompt).strip()
+    finally:
+        readline.set_completer(old_completer)
+        readline.set_completer_delims(old_delims)
+
+
+def _render(out, prompt: str, query: str, top: List[Mapping]) -> None:
+    """Redraw the prompt and result rows in place."""
+    lines = [f"    {d['name']}  [{d['population']}]  ({d['route']})" for d in top]
+    if not top:
+        lines = ["    (no matches)"]
+    buf = ["\r\x1b[J"]  # clear from the prompt down
+    buf.append("\n" + "\n".join(lines))
+    buf.append(f"\x1b[{len(lines)}A\r{prompt}{query}")
+    out.write("".join(buf))
+    out.flush()
+
+
+def _drop_escape(fd: int) -> None:
+    """
+    Discard the rest of an escape sequence (arrow keys etc.) after Esc.
+
+    Each byte is waited for only ESC_TIMEOUT_S, so a lone Esc returns at
+    once instead of blocking until the next keys arrive.
+    """
+    def next_byte() -> bytes:
+        if not select.select([fd], [], [], ESC_TIMEOUT_S)[0]:
+            return b""
+        return os.read(fd, 1)
+
+    lead = next_byte()
+    if lead == b"O":  # SS3: one final byte
+        next_byte()
+    elif lead == b"[":  # CSI: parameters, then a final byte in @..~
+        while True:
+            b = next_byte()
+            if not b or 0x40 <= b[0] <= 0x7E:
+                break
+
+
+def _live_query(prompt: str, search: IncrementalSearch) -> str:
+    fd = sys.stdin.fileno()
+    out = sys.stdout
+    saved = termios.tcgetattr(fd)
+    query = ""
+    decoder = codecs.getincrementaldecoder("utf-8")("ignore")
+    try:
+        tty.setcbreak(fd)
+        _render(out, prompt, query, search.update(query, LIVE_ROWS))
+        while True:
+            try:
+                ch = os.read(fd, 1)
+            except OSError as e:  # EIO once the terminal hangs up
+                raise EOFError from e
+            if not ch:  # EOF: don't spin on empty reads
+                raise EOFError
+            if ch in (b"\r", b"\n"):
+                break
+            if ch == b"\x03":
+                raise KeyboardInterrupt
+            if ch == b"\x04":
+                raise EOFError
+            if ch in (b"\x7f", b"\x08"):
+                decoder.reset()
+                query = query[:-1]
+            elif ch == b"\t":
+                top = search.update(query, 1)
+                if top:
+                    query = top[0]["name"]
+            elif ch == b"\x1b":
+                _drop_escape(fd)
+                continue
+            elif ch >= b" ":
+                text = decoder.decode(ch)  # "" until a multi-byte character is complete
+                if not text:
+                    continue
+                query += text
+            else:
+                continue
+            _render(out, prompt, query, search.update(query, LIVE_ROWS))
+    finally:
+        try:
+            termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+            out.write("\r\x1b[J" + prompt + query + "\n")
+            out.flush()
+        except (termios.error, OSError):
+            pass  # the terminal is gone; nothing to restore
+    return query.strip()
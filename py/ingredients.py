@@ -0,0 +1,347 @@
+"""
+Active-ingredient normalization and cumulative exposure across entries.
+
+The same ingredient sits under several formulary entries (Epinephrine IM,
+Epinephrine infusion, Racemic Epinephrine neb; D10W boluses; saline
+fluids). IngredientIndex maps every entry to its ingredient(s) in a common
+unit and keeps, per ingredient, a bitset of the entries that contain it,
+so an order set is totalled per ingredient in one pass and "which orders
+share an ingredient" is a single AND.
+
+An entry's ingredients come from an explicit "ingredients" key when it
+has one:
+
+    "ingredients": [{"ingredient": "dextrose", "unit": "g", "per": 0.1}]
+
+("per" = ingredient units per one unit of the entry's dose amount, e.g.
+0.1 g dextrose per mL of D10W), otherwise from INGREDIENT_PATTERNS, and
+failing that from the entry name with route/form words stripped.
+
+Limits per ingredient default to the tightest max_daily_per_kg /
+max_daily of the entries that contain it; callers can pass their own.
+
+Infusion entries (per-kg-per-time rates such as mcg/kg/min) are indexed,
+so shared() still reports them, but they add nothing to exposure totals
+or limits: a rate is not an amount. Total an infusion separately and
+order it under its bolus entry if it must count.
+
+main_calc builds one index per formulary snapshot (snapshot["ingredients"]);
+a reload patches the previous index (IngredientIndex.updated) so only the
+changed entries are re-normalized.
+
+Usage:
+    python py/ingredients.py                      # ingredient -> entries
+    python py/ingredients.py --all check 12 "Acetaminophen (peds)=180" \\
+        "Acetaminophen (peds)=180"
+"""
+
+import math
+import re
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# mass units -> mg
+MASS_MG = {"mcg": 0.001, "mg": 1.0, "g": 1000.0}
+
+# (name regex, ingredient, ingredient unit, ingredient units per entry unit);
+# first match wins. The entry unit is its max_unit (or dose_unit numerator).
+INGREDIENT_PATTERNS: List[Tuple[str, str, str, float]] = [
+    (r"^d10w\b", "dextrose", "g", 0.1),                        # 10 g / 100 mL
+    (r"^normal saline\b", "sodium chloride", "g", 0.009),      # 0.9 %
+    (r"^hypertonic saline 3%", "sodium chloride", "g", 0.03),  # 3 %
+    (r"^racemic epinephrine\b", "epinephrine", "mg", 1.0),     # whole racemate, conservatively
+    (r"^insulin\b", "insulin", "unit", 1.0),
+]
+
+# words dropped when falling back to the entry name
+_FORM_WORDS = re.compile(
+    r"\b(bolus|infusion|neb|im|iv|po|pr|regular|1:\d+)\b|\(.*?\)", re.IGNORECASE
+)
+
+
+def entry_unit(drug: Mapping) -> str:
+    """Unit that an order amount for this entry is given in."""
+    unit = (drug.get("max_unit") or drug["dose_unit"]).split("/")[0].strip()
+    return "unit" if unit == "units" else unit
+
+
+def is_rate(drug: Mapping) -> bool:
+    """True for infusion entries dosed per kg per minute/hour."""
+    unit = drug["dose_unit"].replace(" ", "").lower()
+    return "/kg/min" in unit or "/kg/hr" in unit
+
+
+def _explicit(name: str, item) -> Tuple[str, str, float]:
+    """One explicit "ingredients" item, validated (ValueError if malformed)."""
+    if not isinstance(item, Mapping):
+        raise ValueError(f"{name}: each ingredients item must be an object")
+    missing = [k for k in ("ingredient", "unit", "per") if k not in item]
+    if missing:
+        raise ValueError(f"{name}: ingredients item missing {', '.join(missing)}")
+    if not isinstance(item["ingredient"], str) or not isinstance(item["unit"], str):
+        raise ValueError(f"{name}: ingredient and unit must be strings")
+    per = item["per"]
+    if (not isinstance(per, (int, float)) or isinstance(per, bool)
+            or not math.isfinite(per) or per <= 0):
+        raise ValueError(f"{name}: ingredients per must be a number > 0, got {per!r}")
+    return item["ingredient"], item["unit"], float(per)
+
+
+def normalize(drug: Mapping) -> List[Tuple[str, str, float]]:
+    """[(ingredient, unit, per)] for one entry."""
+    if drug.get("ingredients"):
+        if not isinstance(drug["ingredients"], list):
+            raise ValueError(f"{drug['name']}: ingredients must be a list")
+        return [_explicit(drug["name"], i) for i in drug["ingredients"]]
+    name = drug["name"].lower()
+    unit = entry_unit(drug)
+    for pattern, ingredient, ing_unit, per in INGREDIENT_PATTERNS:
+        if re.search(pattern, name):
+            if unit in MASS_MG and ing_unit in MASS_MG:
+                per *= MASS_MG[unit] / MASS_MG[ing_unit]
+            return [(ingredient, ing_unit, per)]
+    base = " ".join(_FORM_WORDS.sub(" ", name).split())
+    if unit in MASS_MG:
+        return [(base, "mg", MASS_MG[unit])]
+    return [(base, unit, 1.0)]
+
+
+class IngredientIndex:
+    """Ingredient <-> entry index over one list of formulary entries."""
+
+    def __init__(self, drugs: Sequence[Mapping]):
+        self.drugs = tuple(drugs)
+        self.position: Dict[str, int] = {}
+        self.ingredients: List[str] = []
+        self.units: List[str] = []
+        self.bits: List[int] = []  # per ingredient: bitset over entry positions
+        self.contrib: List[Tuple[Tuple[int, float], ...]] = []  # per entry: (ingredient, per)
+        self.limits: List[Tuple[Optional[float], Optional[float]]] = []  # (per kg, absolute)
+        self._ids: Dict[str, int] = {}
+
+        for pos, d in enumerate(self.drugs):
+            self.position[d["name"]] = pos
+            self.contrib.append(self._add_entry(pos, d))
+
+    @classmethod
+    def updated(cls, drugs: Sequence[Mapping], previous: "IngredientIndex") -> "IngredientIndex":
+        """
+        Index for `drugs`, patched from the index of the previous snapshot.
+
+        Entries that are the very same objects as in `previous` are kept;
+        only the others are re-normalized, and only the ingredients they
+        touch get new bits and limits. Adding, removing or reordering
+        entries (or emptying an ingredient) falls back to a full build.
+        """
+        drugs = tuple(drugs)
+        old = previous.drugs
+        if len(drugs) != len(old) or any(a["name"] != b["name"] for a, b in zip(drugs, old)):
+            return cls(drugs)
+        changed = [pos for pos, (a, b) in enumerate(zip(drugs, old)) if a is not b]
+
+        self = cls.__new__(cls)
+        self.drugs = drugs
+        self.position = previous.position  # same names, same order
+        self.ingredients = list(previous.ingredients)
+        self.units = list(previous.units)
+        self.bits = list(previous.bits)
+        self.contrib = list(previous.contrib)
+        self.limits = list(previous.limits)
+        self._ids = dict(previous._ids)
+
+        touched = set()
+        for pos in changed:
+            for ingredient, _, _ in normalize(old[pos]):
+                i = self._ids[ingredient]
+                self.bits[i] &= ~(1 << pos)
+                touched.add(i)
+        for pos in changed:
+            for ingredient, unit, _ in normalize(drugs[pos]):
+                i = self._ids.get(ingredient)
+                if i is not None and not self.bits[i]:
+                    self.units[i] = unit  # only the changed entry used it
+        for pos in changed:
+            self.contrib[pos] = self._add_entry(pos, drugs[pos], fold_limits=False)
+            touched.update(i for i, _ in self.contrib[pos])
+            touched.update(self._ids[ing] for ing, _, _ in normalize(drugs[pos]))
+        for i in touched:
+            if not self.bits[i]:
+                return cls(drugs)
+            self.limits[i] = (None, None)
+            bits = self.bits[i]
+            while bits:
+                low = bits & -bits
+                pos = low.bit_length() - 1
+                bits ^= low
+                for j, per in self.contrib[pos]:
+                    if j == i:
+                        self._fold_limit(i, drugs[pos], per)
+        return self
+
+    def _add_entry(self, pos: int, d: Mapping,
+                   fold_limits: bool = True) -> Tuple[Tuple[int, float], ...]:
+        """Set d's ingredient bits (adding new ingredients); returns its contrib."""
+        ids = self._ids
+        parts = []
+        for ingredient, unit, per in normalize(d):
+            i = ids.get(ingredient)
+            if i is None:
+                i = ids[ingredient] = len(self.ingredients)
+                self.ingredients.append(ingredient)
+                self.units.append(unit)
+                self.bits.append(0)
+                self.limits.append((None, None))
+            elif self.units[i] != unit:
+                raise ValueError(f"{d['name']}: {ingredient} in {unit}, elsewhere in {self.units[i]}")
+            self.bits[i] |= 1 << pos
+            if is_rate(d):
+                continue  # indexed for shared(), never totalled
+            parts.append((i, per))
+            if fold_limits:
+                self._fold_limit(i, d, per)
+        return tuple(parts)
+
+    def _fold_limit(self, i: int, d: Mapping, per: float) -> None:
+        per_kg, absolute = self.limits[i]
+        if d.get("max_daily_per_kg") is not None:
+            x = d["max_daily_per_kg"] * per
+            per_kg = x if per_kg is None else min(per_kg, x)
+        if d.get("max_daily") is not None:
+            x = d["max_daily"] * per
+            absolute = x if absolute is None else min(absolute, x)
+        self.limits[i] = (per_kg, absolute)
+
+    def entries_for(self, ingredient: str) -> List[Mapping]:
+        bits = self.bits[self._ids[ingredient]]
+        return [d for pos, d in enumerate(self.drugs) if bits >> pos & 1]
+
+    def order_mask(self, names: Iterable[str]) -> int:
+        mask = 0
+        for name in names:
+            mask |= 1 << self.position[name]
+        return mask
+
+    def shared(self, names: Iterable[str]) -> Dict[str, List[str]]:
+        """Ingredients that two or more *different* ordered entries share."""
+        mask = self.order_mask(names)
+        out = {}
+        for i, bits in enumerate(self.bits):
+            hit = bits & mask
+            if hit & (hit - 1):  # more than one bit set
+                out[self.ingredients[i]] = [d["name"] for pos, d in enumerate(self.drugs)
+                                            if hit >> pos & 1]
+        return out
+
+    def exposure(self, orders: Iterable[Tuple[str, float]]) -> Dict[str, float]:
+        """
+        Total per ingredient for [(entry name, amount in entry unit), ...].
+
+        Infusion (rate) entries contribute nothing; see is_rate().
+        """
+        totals = [0.0] * len(self.ingredients)
+        position, contrib = self.position, self.contrib
+        for name, amount in orders:
+            for i, per in contrib[position[name]]:
+                totals[i] += amount * per
+        return {self.ingredients[i]: t for i, t in enumerate(totals) if t}
+
+    def limit_for(self, ingredient: str, weight_kg: float,
+                  limits: Optional[Mapping[str, Mapping]] = None) -> Optional[float]:
+        per_kg, absolute = self.limits[self._ids[ingredient]]
+        if limits and ingredient in limits:
+            per_kg = limits[ingredient].get("max_per_kg", per_kg)
+            absolute = limits[ingredient].get("max", absolute)
+        caps = [x for x in (per_kg * weight_kg if per_kg is not None else None, absolute)
+                if x is not None]
+        return min(caps) if caps else None
+
+    def check(self, orders: Iterable[Tuple[str, float]], weight_kg: float,
+              limits: Optional[Mapping[str, Mapping]] = None) -> List[Dict]:
+        """
+        Per-ingredient totals for an order set, with the applicable limit.
+
+        Keys: ingredient, unit, total, limit, over.
+        """
+        out = []
+        for ingredient, total in self.exposure(orders).items():
+            limit = self.limit_for(ingredient, weight_kg, limits)
+            out.append({"ingredient": ingredient, "unit": self.units[self._ids[ingredient]],
+                        "total": total, "limit": limit,
+                        "over": limit is not None and total > limit + 1e-9})
+        return out
+
+
+class ExposureTally:
+    """Running per-ingredient totals for one patient, updated per order change."""
+
+    def __init__(self, index: IngredientIndex, weight_kg: float,
+                 limits: Optional[Mapping[str, Mapping]] = None):
+        self.index = index
+        self.totals = [0.0] * len(index.ingredients)
+        self.caps = [index.limit_for(ing, weight_kg, limits) for ing in index.ingredients]
+
+    def add(self, name: str, amount: float) -> List[str]:
+        """Apply one order (negative amount to remove); returns ingredients now over limit."""
+        over = []
+        for i, per in self.index.contrib[self.index.position[name]]:
+            self.totals[i] += amount * per
+            cap = self.caps[i]
+            if cap is not None and self.totals[i] > cap + 1e-9:
+                over.append(self.index.ingredients[i])
+        return over
+
+    def remove(self, name: str, amount: float) -> None:
+        self.add(name, -amount)
+
+
+# ---------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------
+
+
+def main(argv: List[str] = None) -> int:
+    import argparse
+    import main_calc
+
+    parser = argparse.ArgumentParser(description="Ingredient index and exposure check")
+    parser.add_argument("--all", action="store_true",
+                        help="include dose_dump.py entries missing from the main formulary")
+    sub = parser.add_subparsers(dest="cmd")
+    p_check = sub.add_parser("check", help="total an order set per ingredient")
+    p_check.add_argument("weight_kg", type=float)
+    p_check.add_argument("orders", nargs="+", metavar="NAME=AMOUNT")
+    args = parser.parse_args(argv)
+
+    if args.all:
+        index = IngredientIndex(list(main_calc.merged_formulary().values()))
+    else:
+        index = main_calc.current_snapshot()["ingredients"]
+    fmt = main_calc.format_float
+
+    if args.cmd != "check":
+        for i, ingredient in enumerate(index.ingredients):
+            names = [d["name"] for d in index.entries_for(ingredient)]
+            print(f"{ingredient} [{index.units[i]}]: {'; '.join(names)}")
+        return 0
+
+    orders = []
+    for item in args.orders:
+        name, _, amount = item.rpartition("=")
+        if name not in index.position:
+            parser.error(f"unknown drug: {name}")
+        orders.append((name, float(amount)))
+        if is_rate(index.drugs[index.position[name]]):
+            print(f"note: {name} is an infusion rate – not included in totals")
+    over = False
+    for r in index.check(orders, args.weight_kg):
+        flag = "  OVER LIMIT" if r["over"] else ""
+        print(f"{r['ingredient']:24} {fmt(r['total']):>8} {r['unit']:5} "
+              f"limit {fmt(r['limit'])}{flag}")
+        over = over or r["over"]
+    for ingredient, names in index.shared(n for n, _ in orders).items():
+        print(f"note: {ingredient} ordered under {len(names)} entries: {'; '.join(names)}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
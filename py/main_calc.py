@@ -11,7 +11,21 @@ Joe's Neonatal & Pediatric Dosing + Infusion Rate Calculator (CLI)
 Always verify with current institutional protocols.
 """
 
-from typing import List, Dict, Optional
+import json
+import math
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import List, Dict, Mapping, Optional, Tuple
+
+import audit
+import dose_dump
+import dose_rules
+import drug_search
+import ingredients
+import metrics
+import weight_est
 
 # ---------------------------------------------------------------------
 # DRUG TABLE (truncated to the most common examples – you can expand)
@@ -210,7 +224,13 @@ DRUGS: List[Dict] = [
         "max_unit": "mg",
         "typical_low": None,
         "typical_high": None,
-        "notes": "Age ≥ 6 months"
+        "notes": "Age ≥ 6 months",
+        "age_rules": [
+            {"age_years": [0.5, None], "dose_per_kg": 10.0, "interval_hr": 6.0},
+        ],
+        "interval_hr": 6.0,
+        "max_daily_per_kg": 40.0,
+        "max_daily": 2400.0
     },
     {
         "name": "Acetaminophen (peds)",
@@ -223,7 +243,10 @@ DRUGS: List[Dict] = [
         "max_unit": "mg",
         "typical_low": None,
         "typical_high": None,
-        "notes": ""
+        "notes": "",
+        "interval_hr": 4.0,
+        "max_daily_per_kg": 75.0,
+        "max_daily": 4000.0
     },
     {
         "name": "Morphine (peds)",
@@ -238,18 +261,253 @@ DRUGS: List[Dict] = [
         "typical_high": 0.1,
         "notes": "Range 0.05–0.1 mg/kg"
     },
+
+    # --- Neonatal antibiotics (examples) ---
+    {
+        "name": "Ampicillin (neonatal)",
+        "population": "Neonatal",
+        "protocol": "Sepsis / Abdominal wall / Bowel obstruction / HSV risk",
+        "route": "IV",
+        "dose_per_kg": 100.0,
+        "dose_unit": "mg/kg",
+        "max_dose": None,
+        "max_unit": "mg",
+        "typical_low": 50.0,
+        "typical_high": 100.0,
+        "notes": "Frequency age/weight dependent",
+        # same breakpoints as html/neonatal.html (sepsis_ampicillin)
+        "age_rules": [
+            {"weight_kg": [None, 1.0], "pna_days": [None, 14],
+             "dose_per_kg": 100.0, "interval_hr": 12.0},
+            {"weight_kg": [None, 1.0], "pna_days": [14, None],
+             "dose_per_kg": 50.0, "interval_hr": 8.0},
+            {"weight_kg": [1.0, 2.0], "pna_days": [None, 7],
+             "dose_per_kg": 100.0, "interval_hr": 12.0},
+            {"weight_kg": [1.0, 2.0], "pna_days": [7, None],
+             "dose_per_kg": 50.0, "interval_hr": 8.0},
+            {"weight_kg": [2.0, None], "pna_days": [None, 7],
+             "dose_per_kg": 100.0, "interval_hr": 12.0},
+            {"weight_kg": [2.0, None], "pna_days": [7, None],
+             "dose_per_kg": 50.0, "interval_hr": 6.0},
+        ]
+    },
+    {
+        "name": "Gentamicin (neonatal)",
+        "population": "Neonatal",
+        "protocol": "Sepsis / Abdominal wall / Bowel obstruction",
+        "route": "IV",
+        "dose_per_kg": 5.0,
+        "dose_unit": "mg/kg",
+        "max_dose": None,
+        "max_unit": "mg",
+        "typical_low": 4.0,
+        "typical_high": 5.0,
+        "notes": "Frequency age/weight dependent",
+        # same breakpoints as html/neonatal.html (sepsis_gent)
+        "age_rules": [
+            {"weight_kg": [None, 1.0], "pna_days": [None, 14],
+             "dose_per_kg": 5.0, "interval_hr": 48.0},
+            {"weight_kg": [None, 1.0], "pna_days": [14, None],
+             "dose_per_kg": 5.0, "interval_hr": 24.0},
+            {"weight_kg": [1.0, 2.0], "pna_days": [None, 7],
+             "dose_per_kg": 5.0, "interval_hr": 48.0},
+            {"weight_kg": [1.0, 2.0], "pna_days": [7, None],
+             "dose_per_kg": 5.0, "interval_hr": 24.0},
+            {"weight_kg": [2.0, None],
+             "dose_per_kg": 4.0, "interval_hr": 24.0},
+        ]
+    },
 ]
 
+# Optional scheduling keys (used by scheduler.py; absent = unknown):
+#   "interval_hr"       minimum hours between doses
+#   "max_daily_per_kg"  rolling 24 h maximum per kg (same unit as max_unit)
+#   "max_daily"         rolling 24 h absolute maximum
+# and "age_rules" for age/weight dependent dose + interval (see dose_rules.py)
+
+# ---------------------------------------------------------------------
+# FORMULARY SNAPSHOT (hot reload)
+#   Readers grab the current snapshot with a single reference read and
+#   use it for the whole calculation – no locks on the lookup path.
+#   A reload builds a brand new snapshot and swaps the reference, so
+#   in-flight calculations keep the version they started with.
+# ---------------------------------------------------------------------
+
+# Point this at a JSON list of drug entries (same keys as DRUGS) to let
+# pharmacy update doses without restarting the calculator.
+FORMULARY_ENV = "MYDRUGDOSE_FORMULARY"
+
+REQUIRED_KEYS = (
+    "name", "population", "protocol", "route", "dose_per_kg", "dose_unit",
+    "max_dose", "max_unit", "typical_low", "typical_high", "notes",
+)
+
+
+# number or None, and never negative
+NUMERIC_KEYS = (
+    "dose_per_kg", "max_dose", "typical_low", "typical_high",
+    "interval_hr", "max_daily_per_kg", "max_daily",
+)
+STRING_KEYS = ("name", "population", "protocol", "route", "dose_unit", "max_unit", "notes")
+
+
+def _freeze_entry(entry: Dict) -> Mapping:
+    if not isinstance(entry, dict):
+        raise ValueError(f"formulary entry must be a JSON object, got {entry!r}")
+    name = entry.get("name", "?")
+    missing = [k for k in REQUIRED_KEYS if k not in entry]
+    if missing:
+        raise ValueError(f"{name}: missing {', '.join(missing)}")
+    for k in STRING_KEYS:
+        if not isinstance(entry[k], str):
+            raise ValueError(f"{name}: {k} must be a string, got {entry[k]!r}")
+    for k in NUMERIC_KEYS:
+        x = entry.get(k)
+        if x is None:
+            continue
+        if (not isinstance(x, (int, float)) or isinstance(x, bool)
+                or not math.isfinite(x) or x < 0):
+            raise ValueError(f"{name}: {k} must be a number >= 0 or null, got {x!r}")
+    return MappingProxyType(dict(entry))
+
+
+def _build_snapshot(entries: List[Dict], version: int,
+                    source: Optional[str] = None, mtime: float = 0.0,
+                    previous: Optional[Dict] = None) -> Dict:
+    """
+    Build an immutable snapshot from a list of entries.
+
+    When a previous snapshot is given, unchanged entries are reused as-is
+    and only populations whose entries changed get new index postings.
+    """
+    old_by_name = previous["by_name"] if previous else {}
+    drugs = []
+    touched = set()
+    for entry in entries:
+        old = old_by_name.get(entry.get("name"))
+        if old is not None and dict(old) == entry:
+            drugs.append(old)
+            continue
+        frozen = _freeze_entry(entry)
+        drugs.append(frozen)
+        touched.add(frozen["population"].lower())
+        if old is not None:
+            touched.add(old["population"].lower())
+
+    names = [d["name"] for d in drugs]
+    if len(set(names)) != len(names):
+        raise ValueError("duplicate drug names in formulary")
+    new_names = set(names)
+    for name, old in old_by_name.items():
+        if name not in new_names:
+            touched.add(old["population"].lower())
+
+    by_population = {}
+    for d in drugs:
+        by_population.setdefault(d["population"].lower(), []).append(d)
+    old_postings = previous["by_population"] if previous else {}
+    postings = {}
+    for pop, members in by_population.items():
+        if pop not in touched and pop in old_postings:
+            postings[pop] = old_postings[pop]
+        else:
+            postings[pop] = tuple(members)
+
+    old_rules = previous["rules"] if previous else {}
+    rules = {}
+    for d in drugs:
+        if d.get("age_rules"):
+            reused = old_by_name.get(d["name"]) is d and d["name"] in old_rules
+            rules[d["name"]] = (old_rules[d["name"]] if reused
+                                else dose_rules.compile_rules(d["age_rules"]))
+
+    return {
+        "version": version,
+        "source": source,
+        "mtime": mtime,
+        "drugs": tuple(drugs),
+        "by_name": {d["name"]: d for d in drugs},
+        "by_population": postings,
+        "rules": rules,
+        "ingredients": (ingredients.IngredientIndex.updated(drugs, previous["ingredients"])
+                        if previous else ingredients.IngredientIndex(drugs)),
+    }
+
+
+_snapshot: Dict = _build_snapshot(DRUGS, version=0)
+_reload_lock = threading.Lock()  # serializes writers only
+_rejected: Optional[tuple] = None  # (path, mtime) of the last file that failed to load
+
+
+def current_snapshot() -> Dict:
+    """Return the formulary snapshot currently in effect (lock-free)."""
+    return _snapshot
+
+
+def merged_formulary(snapshot: Optional[Dict] = None) -> Dict[str, Mapping]:
+    """Snapshot entries by name, topped up with dose_dump.py entries it lacks."""
+    drugs: Dict[str, Mapping] = {d["name"]: d for d in dose_dump.DRUGS}
+    drugs.update((snapshot or _snapshot)["by_name"])
+    return drugs
+
+
+def reload_formulary(path: str, force: bool = False) -> bool:
+    """
+    Reload the formulary from a JSON file if it changed on disk.
+
+    Returns True if a new snapshot was swapped in. On a bad file the
+    current snapshot stays in effect and the error is printed once; the
+    same (path, mtime) is not retried until the file changes again.
+    """
+    global _snapshot, _rejected
+    with _reload_lock:
+        old = _snapshot
+        mtime = None
+        try:
+            mtime = os.stat(path).st_mtime
+            if not force and old["source"] == path and mtime == old["mtime"]:
+                return False
+            if not force and _rejected == (path, mtime):
+                return False
+            with open(path, encoding="utf-8") as f:
+                entries = json.load(f)
+            if not isinstance(entries, list):
+                raise ValueError("formulary file must hold a JSON list")
+            new = _build_snapshot(entries, old["version"] + 1,
+                                  source=path, mtime=mtime, previous=old)
+        except (OSError, ValueError, KeyError, AttributeError, TypeError) as e:
+            if force or _rejected != (path, mtime):
+                print(f"[formulary] reload of {path} failed, keeping v{old['version']}: {e}")
+            _rejected = (path, mtime)
+            return False
+        _rejected = None
+        _snapshot = new  # single reference swap; readers never block
+        return True
+
+
+def start_formulary_watcher(path: str, interval_s: float = 2.0) -> threading.Thread:
+    """Poll the formulary file in a daemon thread and hot-swap on change."""
+    def _watch():
+        while True:
+            reload_formulary(path)
+            time.sleep(interval_s)
+
+    t = threading.Thread(target=_watch, name="formulary-watcher", daemon=True)
+    t.start()
+    return t
+
+
 # ---------------------------------------------------------------------
 # HELPERS
 # ---------------------------------------------------------------------
 
 
-def filter_by_population(pop: str) -> List[Dict]:
+def filter_by_population(pop: str, snapshot: Optional[Dict] = None) -> List[Dict]:
     """Return drugs filtered by population string ('peds', 'neo', 'all')."""
+    snap = snapshot or _snapshot
     pop = pop.strip().lower()
     if pop in ("all", ""):
-        return DRUGS
+        return list(snap["drugs"])
 
     if pop.startswith("p"):
         target = "pediatric"
@@ -257,18 +515,25 @@ def filter_by_population(pop: str) -> List[Dict]:
         target = "neonatal"
     else:
         print("Unknown population; showing all.")
-        return DRUGS
+        return list(snap["drugs"])
 
-    return [d for d in DRUGS if d["population"].lower() == target]
+    return list(snap["by_population"].get(target, ()))
 
 
-def search_drugs(query: str, population: str) -> List[Dict]:
+@metrics.timed()
+def search_drugs(query: str, population: str,
+                 snapshot: Optional[Dict] = None) -> List[Dict]:
     """Search for drugs by name substring within a population filter."""
-    candidates = filter_by_population(population)
+    candidates = filter_by_population(population, snapshot)
     q = query.lower().strip()
     return [d for d in candidates if q in d["name"].lower()]
 
 
+# drug name -> times picked this session; ranks interactive search results
+_usage: Dict[str, int] = {}
+
+
+@metrics.timed()
 def calculate_dose(weight_kg: float, drug: Dict) -> Optional[float]:
     """
     Calculate a single dose for the given weight and drug.
@@ -283,11 +548,52 @@ def calculate_dose(weight_kg: float, drug: Dict) -> Optional[float]:
     raw = per_kg * weight_kg
     max_dose = drug.get("max_dose", None)
 
+    metrics.inc("calculate_dose", drug["name"])
     if max_dose is not None:
+        if raw > max_dose:
+            metrics.inc("cap_hits", drug["name"])
         return min(raw, max_dose)
     return raw
 
 
+def select_rule(drug: Mapping, factors: Mapping,
+                snapshot: Optional[Dict] = None) -> Optional[Mapping]:
+    """
+    Age/weight rule (dose_per_kg + interval_hr) for this patient.
+
+    Returns None if the drug has no age_rules or no rule applies;
+    raises ValueError if a factor the rules need is missing.
+    """
+    snap = snapshot or _snapshot
+    compiled = snap["rules"].get(drug["name"])
+    if compiled is None:
+        return None
+    return dose_rules.select(compiled, factors)
+
+
+def age_rule_drug(drug: Mapping, weight_kg: float, factors: Optional[Mapping] = None,
+                  snapshot: Optional[Dict] = None) -> Tuple[Optional[Mapping], str]:
+    """
+    (entry with its age rule applied, note) for one patient.
+
+    Drugs without age_rules come back unchanged with an empty note. For the
+    others the rule's dose_per_kg and interval_hr replace the entry's and
+    the note is "q<interval>h"; the entry is None, and the note says why,
+    when a factor is missing or invalid or no rule applies.
+    """
+    snap = snapshot or _snapshot
+    if drug["name"] not in snap["rules"]:
+        return drug, ""
+    try:
+        rule = select_rule(drug, {**(factors or {}), "weight_kg": weight_kg}, snap)
+    except ValueError as e:
+        return None, f"age-dependent – {e}"
+    if rule is None:
+        return None, "no age rule applies – check protocol"
+    return ({**drug, "dose_per_kg": rule["dose_per_kg"], "interval_hr": rule["interval_hr"]},
+            f"q{format_float(rule['interval_hr'])}h")
+
+
 def format_float(x: Optional[float]) -> str:
     if x is None:
         return "-"
@@ -322,16 +628,31 @@ def parse_infusion_unit(dose_unit: str):
     return numerator_unit, time_unit, time_factor
 
 
-def infusion_rate_calc(weight_kg: float, drug: Dict):
+@metrics.timed()
+def infusion_rate_ml_hr(dose_value: float, time_factor: float, weight_kg: float,
+                       total_amt: float, total_vol: float) -> float:
+    """
+    Pump rate in mL/hr for a per-kg infusion dose.
+
+    dose_value is per kg per time unit; time_factor converts it to per hour
+    (60 for per-min, 1 for per-hr, as returned by parse_infusion_unit).
+    """
+    conc = total_amt / total_vol  # numerator_unit per mL
+    # convert dose to per hour (e.g. mcg/kg/min -> mcg/kg/hr)
+    total_per_hr = dose_value * time_factor * weight_kg
+    return total_per_hr / conc
+
+
+def infusion_rate_calc(weight_kg: float, drug: Dict) -> Optional[Dict]:
     """
     Interactive infusion rate calculation:
     - Asks for desired dose (numerator_unit/kg/time)
     - Asks for bag/syringe concentration (amount and volume)
-    - Outputs mL/hr
+    - Outputs mL/hr and returns the infusion parameters used
     """
     info = parse_infusion_unit(drug.get("dose_unit", ""))
     if not info:
-        return
+        return None
 
     numerator_unit, time_unit, time_factor = info
 
@@ -375,12 +696,10 @@ def infusion_rate_calc(weight_kg: float, drug: Dict):
             print("Couldn't parse amount/volume. Try again.")
 
     conc = total_amt / total_vol  # numerator_unit per mL
-
-    # convert dose to per hour (e.g. mcg/kg/min -> mcg/kg/hr)
-    dose_per_kg_per_hr = dose_value * time_factor
-    total_per_hr = dose_per_kg_per_hr * weight_kg
-
-    rate_mL_hr = total_per_hr / conc
+    total_per_hr = dose_value * time_factor * weight_kg
+    rate_mL_hr = infusion_rate_ml_hr(
+        dose_value, time_factor, weight_kg, total_amt, total_vol
+    )
 
     print("\nINFUSION RATE RESULT")
     print("--------------------")
@@ -402,12 +721,163 @@ def infusion_rate_calc(weight_kg: float, drug: Dict):
     print(f"Pump rate: ~ {rate_mL_hr:.2f} mL/hr")
     print("Round to the nearest practical rate per your pump + protocol.\n")
 
+    return {
+        "dose": dose_value,
+        "dose_unit": f"{numerator_unit}/kg/{time_unit}",
+        "amount": total_amt,
+        "volume_ml": total_vol,
+        "rate_ml_hr": rate_mL_hr,
+    }
+
+
+@metrics.timed()
+def lookup_doses(query: str, weight_kg: float, population: str = "",
+                 factors: Optional[Mapping] = None,
+                 snapshot: Optional[Dict] = None) -> List[Dict]:
+    """
+    Non-interactive lookup: one result per drug matching `query`.
+
+    Keys: drug, population, route, dose, raw, unit, capped, note.
+    Infusions and fixed doses come back with dose None and a note; drugs
+    with age_rules pick their rule from `factors` (pna_days, pma_weeks,
+    age_years).
+    """
+    snap = snapshot or _snapshot
+    results = []
+    for drug in search_drugs(query, population, snap):
+        r = {"drug": drug["name"], "population": drug["population"], "route": drug["route"],
+             "dose": None, "raw": None,
+             "unit": drug["max_unit"] or drug["dose_unit"].replace("/kg", ""),
+             "capped": False, "note": ""}
+        results.append(r)
+        if parse_infusion_unit(drug["dose_unit"]):
+            r["note"] = f"infusion {format_float(drug['dose_per_kg'])} {drug['dose_unit']}"
+            continue
+        drug, r["note"] = age_rule_drug(drug, weight_kg, factors, snap)
+        if drug is None:
+            continue
+        dose = calculate_dose(weight_kg, drug)
+        if dose is None:
+            r["note"] = drug.get("notes") or "fixed dose – see protocol"
+            continue
+        r["raw"] = drug["dose_per_kg"] * weight_kg
+        r["dose"] = dose
+        r["capped"] = dose < r["raw"]
+    return results
+
+
+def weight_interval(weight_kg: float, pct: float) -> Tuple[float, float]:
+    """(low, high) weight for weight_kg ± pct percent (0 <= pct < 100)."""
+    if not 0 <= pct < 100:
+        raise ValueError("pct must be >= 0 and < 100")
+    return weight_kg * (1 - pct / 100.0), weight_kg * (1 + pct / 100.0)
+
+
+@metrics.timed()
+def dose_interval(weight_lo: float, weight_hi: float,
+                  drugs: Optional[List[Mapping]] = None,
+                  factors: Optional[Mapping] = None,
+                  snapshot: Optional[Dict] = None) -> List[Dict]:
+    """
+    Dose range over a weight interval for every drug, in one pass.
+
+    The dose min(per_kg * w, max_dose) never decreases with weight, so the
+    interval [weight_lo, weight_hi] maps to [dose(lo), dose(hi)] and the
+    cap engages inside it exactly when per_kg * weight_hi > max_dose.
+
+    Keys: drug, unit, dose_lo, dose_hi, cap, cap_weight_kg, note, where
+    cap is dose_dump.cap_state(): "none" (never capped in the interval),
+    "crosses" (capped above cap_weight_kg) or "capped" (capped across the
+    whole interval). Infusions and fixed doses come back with
+    dose_lo/dose_hi None. Drugs with age_rules take their rule from
+    `factors` (pna_days, pma_weeks, age_years); without them, or when the
+    rule changes inside the interval, the doses are None and note says why.
+    """
+    if weight_lo > weight_hi:
+        raise ValueError("weight_lo must be <= weight_hi")
+    snap = snapshot or _snapshot
+    if drugs is None:
+        drugs = snap["drugs"]
+    out = []
+    for d in drugs:
+        per_kg, max_dose = d["dose_per_kg"], d["max_dose"]
+        r = {"drug": d["name"], "unit": d["max_unit"] or d["dose_unit"].replace("/kg", ""),
+             "dose_lo": None, "dose_hi": None, "cap": "none", "cap_weight_kg": None, "note": ""}
+        out.append(r)
+        if per_kg is None or parse_infusion_unit(d["dose_unit"]):
+            continue
+        d_lo, note = age_rule_drug(d, weight_lo, factors, snap)
+        d_hi, _ = age_rule_drug(d, weight_hi, factors, snap)
+        if d_lo is None and d_hi is None:
+            r["note"] = note
+            continue
+        if (d_lo is None or d_hi is None
+                or (d_lo["dose_per_kg"], d_lo.get("interval_hr"))
+                != (d_hi["dose_per_kg"], d_hi.get("interval_hr"))):
+            r["note"] = "age rule changes within this weight range – see rule"
+            continue
+        per_kg = d_lo["dose_per_kg"]
+        lo, hi = per_kg * weight_lo, per_kg * weight_hi
+        r["cap"] = dose_dump.cap_state(lo, hi, max_dose)
+        if r["cap"] != "none":
+            r["cap_weight_kg"] = max_dose / per_kg
+            lo, hi = min(lo, max_dose), max_dose
+        r["dose_lo"], r["dose_hi"] = lo, hi
+    return out
+
 
 # ---------------------------------------------------------------------
 # MAIN CLI LOOP
 # ---------------------------------------------------------------------
 
 
+# weight uncertainty shown next to doses from an estimated weight
+ESTIMATE_RANGE_PCT = 20.0
+
+FACTOR_PROMPTS = {
+    "pna_days": "Postnatal age in days",
+    "pma_weeks": "Postmenstrual age in weeks",
+    "age_years": "Age in years (e.g. 0.5 for 6 months)",
+}
+
+
+def _apply_age_rule(drug: Mapping, compiled: Dict, weight_kg: float,
+                    known: Optional[Mapping] = None) -> Optional[Mapping]:
+    """
+    Ask for the age factors this drug's rules need and apply the matching rule.
+
+    Returns None when no rule covers the patient – there is no dose to give.
+    Answers are added to `known`, so later lookups for this patient reuse them.
+    """
+    if known is None:
+        known = {}
+    factors = {**known, "weight_kg": weight_kg}
+    for f in dose_rules.needed_factors(compiled):
+        if f in factors:
+            continue
+        while True:
+            try:
+                value = float(input(f"  {FACTOR_PROMPTS[f]}: ").strip())
+            except ValueError:
+                print("  Couldn't parse that as a number. Try again.")
+                continue
+            if not math.isfinite(value) or value < 0:
+                print("  Must be a number >= 0. Try again.")
+                continue
+            factors[f] = known[f] = value
+            break
+
+    rule = dose_rules.select(compiled, factors)
+    if rule is None:
+        print("  Age rule  : none applies for this patient – check protocol.")
+        return None
+    print(
+        f"  Age rule  : {format_float(rule['dose_per_kg'])} {drug['dose_unit']} "
+        f"q{format_float(rule['interval_hr'])}h"
+    )
+    return {**drug, "dose_per_kg": rule["dose_per_kg"], "interval_hr": rule["interval_hr"]}
+
+
 def main():
     print("=" * 72)
     print(" Neonatal & Pediatric Dosing + Infusion Calculator (CLI)")
@@ -415,30 +885,68 @@ def main():
     print("=" * 72)
     print()
 
+    formulary_path = os.environ.get(FORMULARY_ENV)
+    if formulary_path:
+        reload_formulary(formulary_path, force=True)
+        start_formulary_watcher(formulary_path)
+        print(f"Formulary: {formulary_path} (v{current_snapshot()['version']}, "
+              "reloads automatically on change)\n")
+
+    audit_dir = os.environ.get(audit.AUDIT_DIR_ENV)
+    audit_log = audit.AuditLog(audit_dir) if audit_dir else None
+    try:
+        _main_loop(audit_log)
+    finally:
+        if audit_log is not None:
+            audit_log.close()
+
+
+def _main_loop(audit_log: Optional["audit.AuditLog"]):
+
     while True:
         try:
-            weight_str = input("Enter patient weight in kg (or 'q' to quit): ").strip()
+            weight_str = input(
+                "Enter patient weight in kg, or 'age 3' / 'len 95' (cm) to estimate "
+                "(or 'q' to quit): "
+            ).strip()
             if weight_str.lower() in ("q", "quit", "exit"):
                 print("Bye.")
                 return
 
-            weight_kg = float(weight_str)
-            if weight_kg <= 0:
-                print("Weight must be > 0.")
+            weight_source = weight_est.SOURCE_MEASURED
+            known_factors = {}
+            word, _, value = weight_str.lower().partition(" ")
+            if word in ("age", "len", "length"):
+                est = (weight_est.estimate(age_years=float(value)) if word == "age"
+                       else weight_est.estimate(length_cm=float(value)))
+                if est is None:
+                    print("No estimate for that age/length – weigh the patient.")
+                    continue
+                weight_kg, weight_source = round(est[0], 1), est[1]
+                if word == "age":
+                    known_factors = {"age_years": float(value)}
+                print(f"Estimated weight: {format_float(weight_kg)} kg – {weight_source}")
+            else:
+                weight_kg = float(weight_str)
+            if not math.isfinite(weight_kg) or weight_kg <= 0:
+                print("Weight must be a number > 0.")
                 continue
         except ValueError:
             print("Couldn't parse that as a number. Try again.")
             continue
+        estimated = weight_source != weight_est.SOURCE_MEASURED
 
         pop = input(
             "Population [Pediatric / Neonatal / All] "
             "(e.g. 'p', 'n', or Enter for all): "
         ).strip()
 
-        query = input(
-            "Search drug name (substring, e.g. 'epi', 'd10', 'dopamine'): "
-        ).strip()
-        matches = search_drugs(query, pop)
+        snap = current_snapshot()  # this lookup stays on one formulary version
+        search = drug_search.IncrementalSearch(filter_by_population(pop, snap), _usage)
+        query = drug_search.read_query(
+            "Search drug name (e.g. 'epi', 'd10'; Tab completes): ", search
+        )
+        matches = search.update(query)
 
         if not matches:
             print("No drugs found for that search. Try again.\n")
@@ -463,6 +971,7 @@ def main():
             continue
 
         drug = matches[sel - 1]
+        _usage[drug["name"]] = _usage.get(drug["name"], 0) + 1
         print("\nSelected:")
         print(f"  Name      : {drug['name']}")
         print(f"  Population: {drug['population']}")
@@ -478,6 +987,15 @@ def main():
         if drug.get("notes"):
             print(f"  Notes     : {drug['notes']}")
 
+        compiled = snap["rules"].get(drug["name"])
+        if compiled is not None:
+            drug = _apply_age_rule(drug, compiled, weight_kg, known_factors)
+            if drug is None:
+                print("\nNo dose calculated – no age rule covers this patient.")
+                if not _another():
+                    break
+                continue
+
         dose = calculate_dose(weight_kg, drug)
 
         print("\nCALCULATED SINGLE DOSE:")
@@ -499,26 +1017,60 @@ def main():
                 )
             final_unit = drug["max_unit"] or drug["dose_unit"].replace("/kg", "")
             print(f"  Final     : {format_float(dose)} {final_unit}")
+            if estimated:
+                print(f"  *** {weight_est.ESTIMATED_LABEL}: {weight_source} ***")
+                rng = dose_interval(*weight_interval(weight_kg, ESTIMATE_RANGE_PCT), [drug],
+                                    known_factors, snap)[0]
+                if rng["note"]:
+                    print(f"  ±{ESTIMATE_RANGE_PCT:g}% wt : {rng['note']}")
+                elif rng["dose_lo"] is not None:
+                    cap = (f"; max dose from {format_float(rng['cap_weight_kg'])} kg"
+                           if rng["cap"] != "none" else "")
+                    print(f"  ±{ESTIMATE_RANGE_PCT:g}% wt : {format_float(rng['dose_lo'])}"
+                          f"–{format_float(rng['dose_hi'])} {final_unit}{cap}")
 
         # Infusion rate option if applicable
+        infusion = None
         inf_info = parse_infusion_unit(drug.get("dose_unit", ""))
         if inf_info:
             yn = input(
                 "\nCalculate infusion pump rate (mL/hr) for this drug? [y/N]: "
             ).strip().lower()
             if yn in ("y", "yes"):
-                infusion_rate_calc(weight_kg, drug)
-
-        print("\nRemember: verify against your institutional protocol.")
-        print("-" * 72)
-        again = input(
-            "Calculate another drug for this or another patient? [y/N]: "
-        ).strip().lower()
-        if again not in ("y", "yes"):
-            print("Bye.")
+                infusion = infusion_rate_calc(weight_kg, drug)
+
+        if audit_log is not None:
+            raw = None if drug["dose_per_kg"] is None else drug["dose_per_kg"] * weight_kg
+            audit_log.record(
+                drug=drug["name"],
+                population=drug["population"],
+                formulary_version=snap["version"],
+                weight_kg=weight_kg,
+                weight_source=weight_source,
+                raw=raw,
+                dose=dose,
+                capped=dose is not None and raw is not None and dose < raw,
+                unit=drug["max_unit"] or drug["dose_unit"].replace("/kg", ""),
+                infusion=infusion,
+            )
+
+        if not _another():
             break
-        print()
+
+
+def _another() -> bool:
+    """Close one calculation and ask whether to do another."""
+    print("\nRemember: verify against your institutional protocol.")
+    print("-" * 72)
+    again = input(
+        "Calculate another drug for this or another patient? [y/N]: "
+    ).strip().lower()
+    if again not in ("y", "yes"):
+        print("Bye.")
+        return False
+    print()
+    return True
 
 
 if __name__ == "__main__":
-    main()
+    metrics.run_cli(main)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Lightweight hot-path instrumentation for the dosing CLIs.
+
+- Per-function call counters and latency histograms (@timed)
+- Labeled counters, e.g. calculate_dose calls and max-dose cap hits per drug
+- Export as Prometheus text format or JSON
+- run_cli() adds --profile (cProfile + tracemalloc report) and --metrics
+  switches to a CLI main()
+
+Everything is off by default. While disabled, @timed costs one global
+flag check per call and inc() returns immediately.
+"""
+
+import argparse
+import bisect
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+ENABLED = False
+
+# Latency histogram bucket upper bounds (seconds), Prometheus style
+BUCKETS_S: Tuple[float, ...] = (
+    1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0, 5.0,
+)
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, str], int] = {}
+# fn name -> [bucket counts..., +Inf count, sum_seconds]
+_histograms: Dict[str, List[float]] = {}
+
+
+def enable(on: bool = True) -> None:
+    global ENABLED
+    ENABLED = on
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def inc(name: str, label: str = "", n: int = 1) -> None:
+    """Bump a counter, optionally keyed by a label (e.g. a drug name)."""
+    if not ENABLED:
+        return
+    key = (name, label)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record one latency sample for `name`."""
+    if not ENABLED:
+        return
+    idx = bisect.bisect_left(BUCKETS_S, seconds)
+    with _lock:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = [0] * (len(BUCKETS_S) + 1) + [0.0]
+        h[idx] += 1
+        h[-1] += seconds
+
+
+def timed(name: Optional[str] = None) -> Callable:
+    """Decorator: count calls and record latency of the wrapped function."""
+    def deco(fn: Callable) -> Callable:
+        metric = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(metric, time.perf_counter() - t0)
+
+        return wrapper
+    return deco
+
+
+# ---------------------------------------------------------------------
+# EXPORT
+# ---------------------------------------------------------------------
+
+
+def snapshot() -> Dict:
+    """Return a JSON-friendly copy of all counters and histograms."""
+    with _lock:
+        counters: Dict[str, Dict[str, int]] = {}
+        for (name, label), v in _counters.items():
+            counters.setdefault(name, {})[label] = v
+        histograms = {}
+        for fn, h in _histograms.items():
+            histograms[fn] = {
+                "buckets": dict(zip([str(b) for b in BUCKETS_S] + ["+Inf"], h[:-1])),
+                "count": int(sum(h[:-1])),
+                "sum_seconds": h[-1],
+            }
+    return {"counters": counters, "latency": histograms}
+
+
+def _esc(label: str) -> str:
+    return label.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus() -> str:
+    snap = snapshot()
+    lines = []
+    for name, by_label in sorted(snap["counters"].items()):
+        metric = f"mydrugdose_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for label, v in sorted(by_label.items()):
+            labels = f'{{drug="{_esc(label)}"}}' if label else ""
+            lines.append(f"{metric}{labels} {v}")
+
+    if snap["latency"]:
+        metric = "mydrugdose_latency_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for fn, h in sorted(snap["latency"].items()):
+            cumulative = 0
+            for le, n in h["buckets"].items():
+                cumulative += n
+                lines.append(f'{metric}_bucket{{fn="{fn}",le="{le}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{fn="{fn}"}} {h["sum_seconds"]:.9f}')
+            lines.append(f'{metric}_count{{fn="{fn}"}} {h["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path: str) -> None:
+    """Write metrics to `path`: JSON if it ends in .json, else Prometheus text."""
+    with open(path, "w", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            json.dump(snapshot(), f, indent=2)
+            f.write("\n")
+        else:
+            f.write(to_prometheus())
+
+
+# ---------------------------------------------------------------------
+# CLI WRAPPER
+# ---------------------------------------------------------------------
+
+
+def _run_profiled(main: Callable[[], None], report_path: str) -> None:
+    prof = cProfile.Profile()
+    tracemalloc.start()
+    try:
+        prof.runcall(main)
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:20]
+        tracemalloc.stop()
+
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(40)
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write("=== cProfile (top 40 by cumulative time) ===\n")
+            f.write(out.getvalue())
+            f.write("\n=== tracemalloc ===\n")
+            f.write(f"current: {current / 1024:.1f} KiB   peak: {peak / 1024:.1f} KiB\n")
+            for stat in top:
+                f.write(f"{stat}\n")
+            f.write("\n=== metrics ===\n")
+            f.write(to_prometheus())
+        print(f"Profile report written to {report_path}")
+
+
+def run_cli(main: Callable[[], None], argv: Optional[List[str]] = None) -> None:
+    """Run a CLI main() with optional --profile / --metrics switches."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--profile", nargs="?", const="profile_report.txt", metavar="REPORT",
+        help="run under cProfile + tracemalloc and write a report "
+             "(default: profile_report.txt)",
+    )
+    parser.add_argument(
+        "--metrics", metavar="PATH",
+        help="write counters/latency histograms on exit "
+             "(.json for JSON, anything else for Prometheus text)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.profile or args.metrics:
+        enable()
+    try:
+        if args.profile:
+            _run_profiled(main, args.profile)
+        else:
+            main()
+    finally:
+        if args.metrics:
+            write_metrics(args.metrics)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Dosing-frequency scheduler with rolling 24-hour maximum enforcement.
+
+- One "order" per (patient, drug): weight-based dose, interval, daily cap
+  (interval_hr / max_daily_per_kg / max_daily from the formulary, the
+  drug's age_rules, or given explicitly)
+- Next-due times live in a single min-heap for the whole unit, so
+  "what is due in the next 30 minutes" walks only the due part of the
+  heap: O(k log k) for k due orders, independent of unit size
+- administer() refuses a dose that would break the rolling 24 h maximum,
+  and the next due time is pushed out until a full dose fits again
+
+Times are epoch seconds (time.time()).
+
+*** EDUCATIONAL / REFERENCE ONLY ***
+"""
+
+import heapq
+import random
+import sys
+import time
+from collections import deque
+from typing import Deque, Dict, List, Mapping, Optional, Tuple
+
+import main_calc
+
+DAY_S = 24 * 3600.0
+
+
+class DailyMaxExceeded(ValueError):
+    """Giving this dose would exceed the drug's rolling 24-hour maximum."""
+
+
+class Order:
+    __slots__ = ("patient_id", "drug", "weight_kg", "dose", "interval_s",
+                 "daily_max", "given", "given_total", "next_due", "heap_entry")
+
+    def __init__(self, patient_id: str, drug: Mapping, weight_kg: float,
+                 dose: float, interval_s: float, daily_max: Optional[float]):
+        self.patient_id = patient_id
+        self.drug = drug
+        self.weight_kg = weight_kg
+        self.dose = dose
+        self.interval_s = interval_s
+        self.daily_max = daily_max
+        self.given: Deque[Tuple[float, float]] = deque()  # (ts, amount) within 24 h
+        self.given_total = 0.0
+        self.next_due = 0.0
+        self.heap_entry: Optional[list] = None
+
+    def _expire(self, now: float) -> None:
+        while self.given and self.given[0][0] <= now - DAY_S:
+            self.given_total -= self.given.popleft()[1]
+
+    def given_24h(self, now: float) -> float:
+        self._expire(now)
+        return self.given_total
+
+
+def daily_max_for(drug: Mapping, weight_kg: float) -> Optional[float]:
+    """Rolling 24 h cap for this weight: the tighter of the per-kg and absolute limits."""
+    limits = []
+    if drug.get("max_daily_per_kg") is not None:
+        limits.append(drug["max_daily_per_kg"] * weight_kg)
+    if drug.get("max_daily") is not None:
+        limits.append(drug["max_daily"])
+    return min(limits) if limits else None
+
+
+class DoseScheduler:
+    """Tracks next-due times and rolling 24 h totals for a whole unit."""
+
+    def __init__(self, snapshot: Optional[Dict] = None):
+        self._snapshot = snapshot
+        self._orders: Dict[Tuple[str, str], Order] = {}
+        self._heap: List[list] = []  # [next_due, seq, order or None (stale)]
+        self._seq = 0
+        self._stale = 0
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    # -----------------------------------------------------------------
+    # orders
+    # -----------------------------------------------------------------
+
+    def order(self, patient_id: str, drug_name: str, weight_kg: float,
+              start: Optional[float] = None,
+              interval_hr: Optional[float] = None,
+              factors: Optional[Mapping] = None) -> Order:
+        """
+        Start (or replace) a scheduled order; the first dose is due at `start`.
+
+        For drugs with age_rules, `factors` (pna_days, pma_weeks, age_years)
+        pick the dose and interval; an explicit interval_hr still wins.
+        """
+        snap = self._snapshot or main_calc.current_snapshot()
+        drug = snap["by_name"].get(drug_name)
+        if drug is None:
+            raise KeyError(f"unknown drug: {drug_name}")
+        drug, note = main_calc.age_rule_drug(drug, weight_kg, factors, snap)
+        if drug is None:
+            raise ValueError(f"{drug_name}: {note}")
+        interval_hr = interval_hr if interval_hr is not None else drug.get("interval_hr")
+        if not interval_hr or interval_hr <= 0:
+            raise ValueError(f"{drug_name}: no dosing interval in the formulary; pass interval_hr")
+        dose = main_calc.calculate_dose(weight_kg, drug)
+        if dose is None:
+            raise ValueError(f"{drug_name}: no per-kg dose to schedule")
+
+        key = (patient_id, drug_name)
+        if key in self._orders:
+            self.cancel(patient_id, drug_name)
+        o = Order(patient_id, drug, weight_kg, dose, interval_hr * 3600.0,
+                  daily_max_for(drug, weight_kg))
+        self._orders[key] = o
+        self._push(o, start if start is not None else time.time())
+        return o
+
+    def cancel(self, patient_id: str, drug_name: str) -> None:
+        o = self._orders.pop((patient_id, drug_name))
+        self._invalidate(o)
+
+    def get(self, patient_id: str, drug_name: str) -> Order:
+        return self._orders[(patient_id, drug_name)]
+
+    def administer(self, patient_id: str, drug_name: str,
+                   amount: Optional[float] = None, at: Optional[float] = None) -> float:
+        """
+        Record a dose given and reschedule. Returns the new next-due time.
+
+        Raises DailyMaxExceeded (and records nothing) if the dose would
+        push the rolling 24 h total past the drug's daily maximum.
+        """
+        o = self._orders[(patient_id, drug_name)]
+        at = at if at is not None else time.time()
+        amount = o.dose if amount is None else amount
+
+        if o.daily_max is not None and o.given_24h(at) + amount > o.daily_max + 1e-9:
+            raise DailyMaxExceeded(
+                f"{drug_name} for {patient_id}: {o.given_total:g} given in last 24 h, "
+                f"+{amount:g} would exceed max {o.daily_max:g}"
+            )
+        o.given.append((at, amount))
+        o.given_total += amount
+
+        next_due = at + o.interval_s
+        if o.daily_max is not None:
+            # Slide forward until a full dose fits under the rolling cap.
+            total = o.given_total
+            for ts, amt in o.given:
+                if ts <= next_due - DAY_S:
+                    total -= amt
+                    continue
+                if total + o.dose <= o.daily_max + 1e-9:
+                    break
+                next_due = ts + DAY_S
+                total -= amt
+
+        self._invalidate(o)
+        self._push(o, next_due)
+        return next_due
+
+    # -----------------------------------------------------------------
+    # queries
+    # -----------------------------------------------------------------
+
+    def due_within(self, window_s: float, now: Optional[float] = None) -> List[Order]:
+        """
+        Orders due before now + window_s, soonest first.
+
+        Walks the heap as a tree and only descends below entries that are
+        themselves due, so cost grows with the answer, not the unit.
+        """
+        cutoff = (time.time() if now is None else now) + window_s
+        heap = self._heap
+        n = len(heap)
+        out = []
+        stack = [0] if n else []
+        while stack:
+            i = stack.pop()
+            entry = heap[i]
+            if entry[0] > cutoff:
+                continue  # heap property: nothing below is due either
+            if entry[2] is not None:
+                out.append((entry[0], entry[1], entry[2]))
+            for c in (2 * i + 1, 2 * i + 2):
+                if c < n:
+                    stack.append(c)
+        out.sort()
+        return [o for _, _, o in out]
+
+    def next_due(self) -> Optional[Order]:
+        heap = self._heap
+        while heap and heap[0][2] is None:
+            heapq.heappop(heap)
+            self._stale -= 1
+        return heap[0][2] if heap else None
+
+    # -----------------------------------------------------------------
+    # heap maintenance (lazy deletion)
+    # -----------------------------------------------------------------
+
+    def _push(self, o: Order, due: float) -> None:
+        self._seq += 1
+        o.next_due = due
+        o.heap_entry = [due, self._seq, o]
+        heapq.heappush(self._heap, o.heap_entry)
+
+    def _invalidate(self, o: Order) -> None:
+        if o.heap_entry is not None:
+            o.heap_entry[2] = None
+            o.heap_entry = None
+            self._stale += 1
+        if self._stale > 64 and self._stale > len(self._heap) // 2:
+            self._heap = [e for e in self._heap if e[2] is not None]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+
+# ---------------------------------------------------------------------
+# DEMO
+# ---------------------------------------------------------------------
+
+
+def main(argv: List[str] = None) -> int:
+    """Simulate a unit and time the 'due in the next 30 minutes' query."""
+    argv = sys.argv[1:] if argv is None else argv
+    patients = int(argv[0]) if argv else 5000
+    rng = random.Random(0)
+    now = time.time()
+    sched = DoseScheduler()
+    for p in range(patients):
+        pid = f"P{p:05d}"
+        w = rng.uniform(5, 60)
+        age = {"age_years": rng.uniform(0.5, 17)}
+        sched.order(pid, "Acetaminophen (peds)", w, start=now + rng.uniform(0, 6 * 3600))
+        sched.order(pid, "Ibuprofen (peds)", w, start=now + rng.uniform(0, 8 * 3600),
+                    factors=age)
+
+    t0 = time.perf_counter()
+    due = sched.due_within(30 * 60, now)
+    dt = time.perf_counter() - t0
+    print(f"{len(sched)} orders; {len(due)} due in the next 30 min "
+          f"(query {dt * 1000:.2f} ms)")
+    for o in due[:10]:
+        mins = (o.next_due - now) / 60
+        print(f"  +{mins:5.1f} min  {o.patient_id}  {o.drug['name']:24} "
+              f"{main_calc.format_float(o.dose)} {o.drug['max_unit']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
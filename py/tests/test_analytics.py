@@ -0,0 +1,73 @@
+import pytest
+
+from analytics import CountMinSketch, HyperLogLog, QuantileSketch
+
+
+def test_quantile_merge_matches_one_sketch_over_all_values():
+    whole, a, b = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i in range(1, 1001):
+        whole.add(float(i))
+        (a if i % 2 else b).add(float(i))
+    a.merge(b)
+    assert a.count == whole.count == 1000
+    assert a.buckets == whole.buckets
+    for q in (0.0, 0.5, 0.99, 1.0):
+        assert a.quantile(q) == whole.quantile(q)
+
+
+def test_quantile_merge_keeps_zeros_and_relative_error():
+    a, b = QuantileSketch(), QuantileSketch()
+    a.add(0.0)
+    b.add(100.0)
+    a.merge(b)
+    assert a.zeros == 1
+    assert a.quantile(1.0) == pytest.approx(100.0, rel=0.01)
+
+
+def test_quantile_merge_respects_bucket_limit():
+    a, b = QuantileSketch(max_buckets=8), QuantileSketch(max_buckets=8)
+    for i in range(1, 50):
+        (a if i % 2 else b).add(1.1 ** i)
+    a.merge(b)
+    assert len(a.buckets) <= 8
+    assert sum(a.buckets.values()) + a.zeros == a.count == 49
+
+
+def test_quantile_merge_rejects_different_accuracy():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_count_min_merge_adds_counts():
+    a, b = CountMinSketch(), CountMinSketch()
+    a.add("epi", 3)
+    b.add("epi", 4)
+    b.add("gent")
+    a.merge(b)
+    assert a.estimate("epi") == 7
+    assert a.estimate("gent") >= 1
+    with pytest.raises(ValueError):
+        a.merge(CountMinSketch(width=16))
+
+
+def test_hyperloglog_merge_is_a_union():
+    a, b, both = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for i in range(2000):
+        key = f"patient-{i}"
+        (a if i < 1200 else b).add(key)
+        if i >= 800:  # overlap 800..1199 goes into both shards
+            a.add(key)
+        both.add(key)
+    a.merge(b)
+    assert a.registers == both.registers
+    assert a.estimate() == pytest.approx(2000, rel=0.05)
+    with pytest.raises(ValueError):
+        a.merge(HyperLogLog(p=10))
+
+
+def test_round_trip_through_dict_then_merge():
+    a = QuantileSketch()
+    a.add(5.0)
+    b = QuantileSketch.from_dict(a.to_dict())
+    b.merge(a)
+    assert b.count == 2
@@ -0,0 +1,56 @@
+import math
+
+import pytest
+
+import dose_rules
+
+RULES = [
+    {"weight_kg": [None, 2.0], "pna_days": [None, 7], "dose_per_kg": 100.0, "interval_hr": 12.0},
+    {"weight_kg": [None, 2.0], "pna_days": [7, None], "dose_per_kg": 50.0, "interval_hr": 8.0},
+    {"weight_kg": [2.0, None], "pna_days": [7, None], "dose_per_kg": 50.0, "interval_hr": 6.0},
+]
+
+
+@pytest.fixture
+def compiled():
+    return dose_rules.compile_rules(RULES)
+
+
+def test_ranges_are_half_open(compiled):
+    assert dose_rules.select(compiled, {"weight_kg": 1.99, "pna_days": 6.9})["interval_hr"] == 12.0
+    assert dose_rules.select(compiled, {"weight_kg": 1.99, "pna_days": 7})["interval_hr"] == 8.0
+    assert dose_rules.select(compiled, {"weight_kg": 2.0, "pna_days": 7})["interval_hr"] == 6.0
+
+
+def test_zero_is_in_the_open_lower_range(compiled):
+    assert dose_rules.select(compiled, {"weight_kg": 0.5, "pna_days": 0})["dose_per_kg"] == 100.0
+
+
+def test_no_matching_rule_gives_none(compiled):
+    assert dose_rules.select(compiled, {"weight_kg": 2.5, "pna_days": 3}) is None
+
+
+def test_missing_factor_raises(compiled):
+    with pytest.raises(ValueError, match="pna_days is needed"):
+        dose_rules.select(compiled, {"weight_kg": 1.5})
+
+
+@pytest.mark.parametrize("bad", [math.nan, math.inf, -1.0, "7"])
+def test_bad_factor_raises(compiled, bad):
+    with pytest.raises(ValueError, match="finite number"):
+        dose_rules.select(compiled, {"weight_kg": 1.5, "pna_days": bad})
+
+
+def test_select_batch_skips_unusable_rows(compiled):
+    rows = [{"drug": "Gent", "weight_kg": 1.5, "pna_days": 10},
+            {"drug": "Gent", "weight_kg": 1.5},
+            {"drug": "Other", "weight_kg": 1.5, "pna_days": 10}]
+    out = dose_rules.select_batch({"Gent": compiled}, rows)
+    assert [r and r["interval_hr"] for r in out] == [8.0, None, None]
+
+
+def test_compile_rejects_non_numeric_rule_values():
+    with pytest.raises(ValueError):
+        dose_rules.compile_rules([{"pna_days": [None, 7], "dose_per_kg": "5", "interval_hr": 12.0}])
+    with pytest.raises(ValueError):
+        dose_rules.compile_rules([{"pna_days": [None], "dose_per_kg": 5.0, "interval_hr": 12.0}])
@@ -0,0 +1,46 @@
+import main_calc
+import drawup
+
+ACET = main_calc.current_snapshot()["by_name"]["Acetaminophen (peds)"]  # 32 mg/mL stock
+
+
+def test_volume_rounds_to_the_syringe_graduation():
+    card = drawup.draw_up(10.0, ACET)  # 150 mg = 4.6875 mL -> 5 mL syringe, 0.2 mL marks
+    assert card["syringe_ml"] == 5.0
+    assert card["volume_ml"] == 4.6
+    assert card["given"] == 147.2
+
+
+def test_exact_half_graduation_rounds_up():
+    card = drawup.draw_up(10.0, dict(ACET, dose_per_kg=19.52))  # 6.1 mL on 0.2 mL marks
+    assert card["volume_ml"] == 6.2
+
+
+def test_capped_dose_rounds_down_not_past_the_max():
+    capped = drawup.draw_up(50.0, dict(ACET, max_dose=656.0))  # 20.5 mL at the max
+    assert capped["dose"] == 656.0
+    assert capped["volume_ml"] == 20.0
+    assert capped["given"] <= 656.0
+    # the same dose below the cap rounds half up
+    uncapped = drawup.draw_up(50.0, dict(ACET, max_dose=None, dose_per_kg=13.12))
+    assert uncapped["volume_ml"] == 21.0
+
+
+def test_rounding_pct_is_signed_given_vs_dose():
+    card = drawup.draw_up(10.0, ACET)
+    assert card["rounding_pct"] < 0
+    assert abs(card["rounding_pct"] - (147.2 - 150.0) / 150.0 * 100) < 1e-9
+
+
+def test_no_float_drift_in_volumes():
+    for w in (0.1, 0.3, 0.77, 1.7, 2.9):  # each lands on a graduation
+        card = drawup.draw_up(w, dict(ACET, dose_per_kg=32.0))  # 1 mL per kg
+        assert card["volume_ml"] == round(w, 2)
+
+
+def test_age_rule_drug_without_factors_is_not_drawn_up():
+    gent = main_calc.current_snapshot()["by_name"]["Gentamicin (neonatal)"]
+    card = drawup.draw_up(1.5, gent)
+    assert card["volume_ml"] is None
+    assert card["note"].startswith("age-dependent")
+    assert drawup.draw_up(1.5, gent, {"pna_days": 10})["volume_ml"] is not None
@@ -0,0 +1,55 @@
+import pytest
+
+import scheduler
+from scheduler import DAY_S, DailyMaxExceeded, DoseScheduler
+
+HOUR = 3600.0
+DRUG = "Acetaminophen (peds)"  # 15 mg/kg q4h, 75 mg/kg/day
+
+
+@pytest.fixture
+def sched():
+    s = DoseScheduler()
+    s.order("p1", DRUG, 10.0, start=0.0)  # 150 mg per dose, 750 mg per 24 h
+    return s
+
+
+def give(s, *hours):
+    return [s.administer("p1", DRUG, at=h * HOUR) for h in hours]
+
+
+def test_next_due_is_one_interval_later_while_under_cap(sched):
+    assert give(sched, 0) == [4 * HOUR]
+
+
+def test_next_due_slides_until_a_full_dose_fits(sched):
+    # five doses reach 750 mg; the sixth fits only once the first leaves the window
+    *_, last = give(sched, 0, 4, 8, 12, 16)
+    assert last == DAY_S
+
+
+def test_dose_inside_window_is_refused_and_not_recorded(sched):
+    give(sched, 0, 4, 8, 12, 16)
+    with pytest.raises(DailyMaxExceeded):
+        sched.administer("p1", DRUG, at=DAY_S - 1)
+    assert sched.get("p1", DRUG).given_24h(DAY_S - 1) == pytest.approx(750.0)
+
+
+def test_dose_exactly_24h_later_is_allowed(sched):
+    give(sched, 0, 4, 8, 12, 16)
+    sched.administer("p1", DRUG, at=DAY_S)
+    assert sched.get("p1", DRUG).given_24h(DAY_S) == pytest.approx(750.0)
+
+
+def test_partial_doses_slide_past_several_entries(sched):
+    sched.administer("p1", DRUG, amount=50.0, at=0.0)
+    sched.administer("p1", DRUG, amount=50.0, at=1 * HOUR)
+    # 700 given: a full 150 mg dose fits only once both small doses have expired
+    assert sched.administer("p1", DRUG, amount=600.0, at=2 * HOUR) == DAY_S + 1 * HOUR
+
+
+def test_daily_max_takes_the_tighter_limit():
+    drug = {"max_daily_per_kg": 75.0, "max_daily": 4000.0}
+    assert scheduler.daily_max_for(drug, 10.0) == 750.0
+    assert scheduler.daily_max_for(drug, 80.0) == 4000.0
+    assert scheduler.daily_max_for({}, 10.0) is None
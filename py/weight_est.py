@@ -0,0 +1,285 @@
+"""
+Weight estimation from age or length when no measured weight is available.
+
+- Age: APLS formulas, precomputed on a monthly grid (0-12 years) and
+  linearly interpolated:
+      < 1 year     (0.5 x age in months) + 4
+      1-5 years    (2 x age in years) + 8
+      6-12 years   (3 x age in years) + 7
+- Length: Broselow-style colour bands (46-146.5 cm); the estimate is the
+  middle of the band's weight range. Check the band edges against the
+  tape edition your service carries.
+
+Length wins when both are given. Anything outside the tables gives no
+estimate – weigh the patient. Every estimate carries a source label
+(SOURCE_AGE / SOURCE_LENGTH) and doses computed from it must say so.
+
+estimate_batch() interpolates whole columns at once (numpy when
+installed, bisect otherwise), so backfilling a census is cheap:
+
+    python py/weight_est.py 3 --length 95
+    python py/weight_est.py backfill census.csv filled.csv
+
+The census needs age_years and/or length_cm columns; rows with an empty
+weight_kg get an estimate and weight_source, and rows with a drug column
+get dose, dose_unit and dose_label ("ESTIMATED WEIGHT" when estimated).
+Drugs with age rules take their rule from the row's age_years / pna_days /
+pma_weeks; the dose stays blank when a factor is missing or no rule applies.
+"""
+
+import sys
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional – pure Python fallback below
+    np = None
+
+SOURCE_MEASURED = "measured"
+SOURCE_AGE = "estimated (APLS age)"
+SOURCE_LENGTH = "estimated (length band)"
+
+ESTIMATED_LABEL = "ESTIMATED WEIGHT"
+
+MAX_AGE_YEARS = 12.0
+
+# census columns passed to age-rule selection when present
+FACTOR_COLUMNS = ("age_years", "pna_days", "pma_weeks")
+
+
+def apls_weight(age_years: float) -> float:
+    """APLS formula weight in kg (no table, no range check)."""
+    if age_years < 1:
+        return 0.5 * (age_years * 12) + 4
+    if age_years < 6:
+        return 2 * age_years + 8
+    return 3 * age_years + 7
+
+
+# monthly grid, 0 .. 12 years inclusive
+AGE_GRID_YEARS: List[float] = [m / 12 for m in range(int(MAX_AGE_YEARS * 12) + 1)]
+AGE_GRID_KG: List[float] = [apls_weight(a) for a in AGE_GRID_YEARS]
+# The formula jumps at 6 years (2 x 6 + 8 = 20 -> 3 x 6 + 7 = 25 kg): repeat 6.0
+# with the left-limit weight so interpolation never runs across the jump.
+_jump = AGE_GRID_YEARS.index(6.0)
+AGE_GRID_YEARS.insert(_jump, 6.0)
+AGE_GRID_KG.insert(_jump, 2 * 6.0 + 8)
+
+# (length lower bound cm, colour, weight low kg, weight high kg); the last
+# band ends at LENGTH_MAX_CM.
+LENGTH_BANDS: List[Tuple[float, str, float, float]] = [
+    (46.0, "grey", 3.0, 5.0),
+    (59.5, "pink", 6.0, 7.0),
+    (66.5, "red", 8.0, 9.0),
+    (74.0, "purple", 10.0, 11.0),
+    (84.5, "yellow", 12.0, 14.0),
+    (97.5, "white", 15.0, 18.0),
+    (110.0, "blue", 19.0, 23.0),
+    (122.0, "orange", 24.0, 29.0),
+    (137.0, "green", 30.0, 36.0),
+]
+LENGTH_MAX_CM = 146.5
+
+_BAND_EDGES = [b[0] for b in LENGTH_BANDS] + [LENGTH_MAX_CM]
+_BAND_KG = [(lo + hi) / 2 for _, _, lo, hi in LENGTH_BANDS]
+
+
+def length_band(length_cm: float) -> Optional[Tuple[str, float]]:
+    """(colour, estimated kg) for a length, or None if off the tape."""
+    if not (_BAND_EDGES[0] <= length_cm < LENGTH_MAX_CM):
+        return None
+    i = bisect_right(_BAND_EDGES, length_cm) - 1
+    return LENGTH_BANDS[i][1], _BAND_KG[i]
+
+
+def _age_kg(age_years: float) -> Optional[float]:
+    if not (0 <= age_years <= MAX_AGE_YEARS):
+        return None
+    i = min(bisect_right(AGE_GRID_YEARS, age_years), len(AGE_GRID_YEARS) - 1)
+    x0, x1 = AGE_GRID_YEARS[i - 1], AGE_GRID_YEARS[i]
+    y0, y1 = AGE_GRID_KG[i - 1], AGE_GRID_KG[i]
+    return y0 + (y1 - y0) * (age_years - x0) / (x1 - x0)
+
+
+def estimate(age_years: Optional[float] = None,
+             length_cm: Optional[float] = None) -> Optional[Tuple[float, str]]:
+    """(weight kg, source label) for one patient, or None if no estimate applies."""
+    if length_cm is not None:
+        band = length_band(length_cm)
+        if band is not None:
+            return band[1], SOURCE_LENGTH
+    if age_years is not None:
+        kg = _age_kg(age_years)
+        if kg is not None:
+            return kg, SOURCE_AGE
+    return None
+
+
+def estimate_batch(ages: Sequence[Optional[float]],
+                   lengths: Sequence[Optional[float]]) -> Tuple[List[Optional[float]], List[Optional[str]]]:
+    """
+    Vectorized estimate() over two equal-length columns (None = missing).
+
+    Returns (weights, sources) with None where no estimate applies.
+    """
+    n = len(ages)
+    if np is None:
+        out = [estimate(a, l) for a, l in zip(ages, lengths)]
+        return [o[0] if o else None for o in out], [o[1] if o else None for o in out]
+
+    age = np.array([np.nan if a is None else a for a in ages], dtype=float)
+    length = np.array([np.nan if l is None else l for l in lengths], dtype=float)
+
+    kg = np.full(n, np.nan)
+    source = np.zeros(n, dtype=np.int8)  # 0 none, 1 age, 2 length
+
+    age_ok = (age >= 0) & (age <= MAX_AGE_YEARS)
+    kg[age_ok] = np.interp(age[age_ok], AGE_GRID_YEARS, AGE_GRID_KG)
+    source[age_ok] = 1
+
+    len_ok = (length >= _BAND_EDGES[0]) & (length < LENGTH_MAX_CM)
+    idx = np.searchsorted(_BAND_EDGES, length[len_ok], side="right") - 1
+    kg[len_ok] = np.asarray(_BAND_KG)[idx]
+    source[len_ok] = 2
+
+    labels = (None, SOURCE_AGE, SOURCE_LENGTH)
+    return ([None if s == 0 else float(k) for k, s in zip(kg.tolist(), source.tolist())],
+            [labels[s] for s in source.tolist()])
+
+
+# ---------------------------------------------------------------------
+# CENSUS BACKFILL
+# ---------------------------------------------------------------------
+
+
+def _num(s: str) -> Optional[float]:
+    try:
+        return float(s) if s else None
+    except ValueError:
+        return None
+
+
+def backfill_rows(rows: List[List[str]], cols: Dict[str, int], dose_fn=None) -> int:
+    """
+    Fill weight_kg / weight_source in place for one chunk of CSV rows.
+
+    rows are lists already padded to the output width; cols maps column
+    name -> index. dose_fn(drug name, weight_kg, factors) -> (dose, unit) or
+    None fills dose, dose_unit and dose_label; factors is a sorted tuple of
+    (column, value) pairs from FACTOR_COLUMNS. Returns how many weights were
+    estimated.
+    """
+    w_col, src_col = cols["weight_kg"], cols["weight_source"]
+    age_col, len_col = cols.get("age_years"), cols.get("length_cm")
+    missing = []
+    for i, r in enumerate(rows):
+        if _num(r[w_col]) is None:
+            missing.append(i)
+        else:
+            r[src_col] = r[src_col] or SOURCE_MEASURED  # keep labels from an earlier pass
+    weights, sources = estimate_batch(
+        [_num(rows[i][age_col]) if age_col is not None else None for i in missing],
+        [_num(rows[i][len_col]) if len_col is not None else None for i in missing],
+    )
+    estimated = 0
+    for i, w, s in zip(missing, weights, sources):
+        if w is not None:
+            rows[i][w_col] = f"{w:.1f}"
+            rows[i][src_col] = s
+            estimated += 1
+    if dose_fn is None:
+        return estimated
+
+    drug_col = cols["drug"]
+    d_col, u_col, l_col = cols["dose"], cols["dose_unit"], cols["dose_label"]
+    f_cols = [(f, cols[f]) for f in FACTOR_COLUMNS if f in cols]
+    for r in rows:
+        if not r[src_col]:
+            continue
+        factors = tuple((f, x) for f, x in ((f, _num(r[c])) for f, c in f_cols) if x is not None)
+        out = dose_fn(r[drug_col], float(r[w_col]), factors)
+        if out is None:
+            continue
+        r[d_col], r[u_col] = out
+        r[l_col] = "" if r[src_col] == SOURCE_MEASURED else ESTIMATED_LABEL
+    return estimated
+
+
+def main(argv: List[str] = None) -> int:
+    import argparse
+    import csv
+    import functools
+    from itertools import islice
+
+    parser = argparse.ArgumentParser(description="Estimate weight from age or length")
+    sub = parser.add_subparsers(dest="cmd")
+    p_fill = sub.add_parser("backfill", help="fill missing weights in a census CSV")
+    p_fill.add_argument("input")
+    p_fill.add_argument("output")
+    p_fill.add_argument("--chunk", type=int, default=65536, help="rows per batch")
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv or argv[0] != "backfill":
+        one = argparse.ArgumentParser(description="Estimate one patient's weight")
+        one.add_argument("age_years", type=float, nargs="?")
+        one.add_argument("--length", type=float, dest="length_cm", help="length in cm")
+        a = one.parse_args(argv)
+        est = estimate(a.age_years, a.length_cm)
+        if est is None:
+            print("No estimate for that age/length – weigh the patient.")
+            return 1
+        band = length_band(a.length_cm) if a.length_cm is not None else None
+        colour = f", {band[0]} band" if band and est[1] == SOURCE_LENGTH else ""
+        print(f"{est[0]:.1f} kg – {est[1]}{colour}")
+        return 0
+    args = parser.parse_args(argv)
+
+    import main_calc
+    snap = main_calc.current_snapshot()
+    by_name = snap["by_name"]
+
+    @functools.lru_cache(maxsize=65536)  # census weights repeat at 0.1 kg
+    def dose_fn(name: str, weight_kg: float,
+                factors: Tuple[Tuple[str, float], ...]) -> Optional[Tuple[str, str]]:
+        drug = by_name.get(name)
+        if drug is None:
+            return None
+        drug, _ = main_calc.age_rule_drug(drug, weight_kg, dict(factors), snap)
+        if drug is None:  # a needed factor is missing from the row, or no rule applies
+            return None
+        dose = main_calc.calculate_dose(weight_kg, drug)
+        if dose is None:
+            return None
+        return f"{dose:.4g}", drug["max_unit"] or drug["dose_unit"].replace("/kg", "")
+
+    with open(args.input, newline="", encoding="utf-8") as fin, \
+            open(args.output, "w", newline="", encoding="utf-8") as fout:
+        reader = csv.reader(fin)
+        fields = next(reader, [])
+        has_drug = "drug" in fields
+        for col in ["weight_kg", "weight_source"] + (["dose", "dose_unit", "dose_label"]
+                                                      if has_drug else []):
+            if col not in fields:
+                fields.append(col)
+        cols = {name: i for i, name in enumerate(fields)}
+        width = len(fields)
+        writer = csv.writer(fout)
+        writer.writerow(fields)
+        total = estimated = 0
+        while True:
+            chunk = list(islice(reader, args.chunk))
+            if not chunk:
+                break
+            for r in chunk:
+                if len(r) < width:
+                    r.extend([""] * (width - len(r)))
+            estimated += backfill_rows(chunk, cols, dose_fn if has_drug else None)
+            writer.writerows(chunk)
+            total += len(chunk)
+    print(f"{total:,} rows, {estimated:,} weights estimated -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())